@@ -1,58 +1,143 @@
-import pandas as pd
-import numpy as np
-import tensorflow as tf
-import matplotlib.pyplot as plt
+"""
+Run python Rummikub_main.py and follow the instructions, or give the tiles as text (then tensorflow is not
+imported):
 
-import os
-import importlib
-
-tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)#avoids printing warnings when loading tf models
+python Rummikub_main.py --table 3b,4b,5b --hand 6b,2r
+python Rummikub_main.py --hand 10b,11b,12b,7r --initial_meld
+"""
 
-#Modules for obj detection/classification
-from modules.neural_network_modules import get_info_photo as get_cards
-from modules.neural_network_modules import model_number_and_color as my_models
+import argparse
+import os
+import sys
 
 # Solver
-from modules import find_admissible_sets as admissible_sets
 from modules import find_matrix as find_matrix
 from modules import solver as solver
+from modules import initial_meld as initial_meld
+from modules.neural_network_modules.labels import fix_jokers
 
-#importlib.reload(get_cards)
-print('##############')
-print('##############')
-LOC_CARDS_ON_TABLE = input('Enter the location of the photo of the tiles on the table. For example, a valid input could be models/table_1.jpeg. ')
-print('##############')
-print('##############')
-CARDS_ON_HAND = input('Enter the tiles in you hand separated by a comma and with no spaces. For example, 3b,2r,5n would mean 3 blue, 2 red, 5 black. ').split(',')
-print('##############')
-print('##############')
+# the neural networks (and tensorflow) are imported only to read a photo
 
-## Models
 
-print('Loading classification models...')
-model_color = my_models.load_model_color('models/weights_model_predict_color')
-model_number = my_models.load_model_number('models/weights_model_predict_number/accuracy1.0')
-print('Done!')
+def read_tiles(text):
+    """
+    Tiles of a string like '3b,2r,5n' (an empty string has no tiles).
+    """
+    return [card.strip() for card in text.split(',') if card.strip()]
 
-print('Loading object detection model...')
-detect_fn = tf.saved_model.load('models/saved_model_obj_det')
-print('Done!')
 
+parser = argparse.ArgumentParser(description='Helper for Rummikub.')
+parser.add_argument('--table', help='tiles on the table separated by a comma, instead of a photo')
+parser.add_argument('--hand', help='tiles in your hand separated by a comma')
+parser.add_argument('--initial_meld', action='store_true', help='find your initial meld with the tiles of --hand')
+ARGS = parser.parse_args()
+TEXT_INPUT = ARGS.table is not None
 
-print('Processing cards on the table...')
-cards_on_table_j = get_cards.get_cards_in_photo(LOC_CARDS_ON_TABLE, detect_fn, model_number, model_color,
-                                                conf_threshold_number=.95, conf_threshold_color=.5,)
-print('Done!')
+if ARGS.initial_meld or TEXT_INPUT:
+    INITIAL_MELD_DONE = not ARGS.initial_meld
+else:
+    print('##############')
+    print('##############')
+    INITIAL_MELD_DONE = input('Did you already play your initial meld (sets worth at least 30 points)? Enter y or n. ').strip().lower() != 'n'
+if not INITIAL_MELD_DONE:
+    if ARGS.hand is None:
+        print('##############')
+        print('##############')
+        ARGS.hand = input('Enter the tiles in you hand separated by a comma and with no spaces. For example, 3b,2r,5n would mean 3 blue, 2 red, 5 black. ')
+    cards_on_hand = fix_jokers(read_tiles(ARGS.hand))
+    found, meld, points = initial_meld.initial_meld(cards_on_hand)
+    if found:
+        print('You can play your initial meld, worth', points, 'points! Here is how:')
+        print(meld)
+    else:
+        print("Looks like you can't play your initial meld.")
+    sys.exit()
+if not TEXT_INPUT:
+    print('##############')
+    print('##############')
+    LOC_CARDS_ON_TABLE = input('Enter the location of the photo of the tiles on the table. For example, a valid input could be models/table_1.jpeg. ')
+if ARGS.hand is None:
+    print('##############')
+    print('##############')
+    ARGS.hand = input('Enter the tiles in you hand separated by a comma and with no spaces. For example, 3b,2r,5n would mean 3 blue, 2 red, 5 black. ')
+CARDS_ON_HAND = read_tiles(ARGS.hand)
+if not TEXT_INPUT:
+    print('##############')
+    print('##############')
 
-def fix_jokers(list_of_cards):
-    result = []
-    for card in list_of_cards:
-        if card[0] != 'j':
-            if len(card)<4:
-                result.append(card)
+## Models
+
+if TEXT_INPUT:
+    cards_on_table_j = read_tiles(ARGS.table)
+else:
+    from modules.neural_network_modules import model_client as model_client
+    from modules.neural_network_modules import result_cache as result_cache
+
+    # a photo already analysed is read from the cache of modules/neural_network_modules/result_cache.py, otherwise
+    # if the model server of modules/neural_network_modules/model_server.py is running, use it, otherwise if the
+    # fused model of modules/neural_network_modules/export_pipeline.py was exported, use it
+    from modules.neural_network_modules.model_locations import (PIPELINE_LOCATION, DETECTION_LOCATION, NUMBER_LOCATION,
+                                                                COLOR_LOCATION)
+    # the photo is detected at DETECTION_SIZE and the tiles are cropped at CROP_SIZE, not at full resolution
+    from modules.neural_network_modules.image_decoding import DETECTION_SIZE, CROP_SIZE
+    client = model_client.ModelClient()
+    USE_SERVER = client.ping()
+    # the key of the results of the models which would be used
+    if USE_SERVER:
+        settings = client.settings()
+    elif os.path.exists(PIPELINE_LOCATION):
+        settings = {'backend': 'fused', 'detection_size': DETECTION_SIZE, 'crop_size': None}
+    else:
+        settings = {'detection_size': DETECTION_SIZE, 'crop_size': CROP_SIZE}
+    cache = result_cache.ResultCache()
+    cache_key = cache.key(LOC_CARDS_ON_TABLE, conf_threshold_number=.95, conf_threshold_color=.5, **settings)
+
+    if cache_key in cache:
+        print('The cards on the table were already found, reading them from the cache.')
+        cards_on_table_j = cache.get(cache_key)['labels']
+        client.close()
+    elif USE_SERVER:
+        print('Processing cards on the table with the model server...')
+        cards_on_table_j = model_client.get_cards_in_photo(LOC_CARDS_ON_TABLE, client,
+                                                           conf_threshold_number=.95, conf_threshold_color=.5,
+                                                           cache=cache)
+        client.close()
+        print('Done!')
+    else:
+        import tensorflow as tf
+        tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)#avoids printing warnings when loading tf models
+
+        #Modules for obj detection/classification
+        from modules.neural_network_modules import get_info_photo as get_cards
+        from modules.neural_network_modules import model_number_and_color as my_models
+
+        if os.path.exists(PIPELINE_LOCATION):
+            print('Loading models...')
+            pipeline = tf.saved_model.load(PIPELINE_LOCATION)
+            print('Done!')
+
+            print('Processing cards on the table...')
+            cards_on_table_j = get_cards.get_cards_in_photo_with_pipeline(LOC_CARDS_ON_TABLE, pipeline,
+                                                                          conf_threshold_number=.95, conf_threshold_color=.5,
+                                                                          detection_size=DETECTION_SIZE, cache=cache)
+            print('Done!')
         else:
-            result.append('j')
-    return result
+            print('Loading classification models...')
+            model_color = my_models.load_model_color(COLOR_LOCATION)
+            model_number = my_models.load_model_number(NUMBER_LOCATION)
+            print('Done!')
+
+            print('Loading object detection model...')
+            detect_fn = tf.saved_model.load(DETECTION_LOCATION)
+            print('Done!')
+
+
+            print('Processing cards on the table...')
+            cards_on_table_j = get_cards.get_cards_in_photo(LOC_CARDS_ON_TABLE, detect_fn, model_number, model_color,
+                                                            conf_threshold_number=.95, conf_threshold_color=.5,
+                                                            detection_size=DETECTION_SIZE, crop_size=CROP_SIZE,
+                                                            cache=cache)
+            print('Done!')
 
 cards_on_table = fix_jokers(cards_on_table_j)        
 cards_on_hand = fix_jokers(CARDS_ON_HAND)
@@ -61,7 +146,10 @@ cards_on_hand = fix_jokers(CARDS_ON_HAND)
 matrix = find_matrix.from_cards_to_matrix(cards_on_table + cards_on_hand)
 dic_cards_on_table = find_matrix.create_dic_multiplicities(cards_on_table, diversify_jokers=True)
 
-result, winning_set = solver.solver(matrix, dic_cards_on_table)
+# with an empty table the default engine only says that a set can be made with the hand, the dlx engine also
+# returns it
+ENGINE = 'dataframe' if cards_on_table else 'dlx'
+result, winning_set = solver.solver(matrix, dic_cards_on_table, engine=ENGINE)
 
 if result:
     print('You can play! Here is how:')
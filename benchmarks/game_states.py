@@ -0,0 +1,194 @@
+"""
+Main function: generate_states. A seeded generator of game states (tiles on the table, tiles in the hand) for the
+benchmarks.
+
+The table is made of valid sets (runs of 3 to 5 tiles of one color, groups of 3 or 4 tiles with the same number),
+so it is a position that can happen in a game. Then:
+- duplicates is the probability that a set of the table, or a tile of the hand, is a copy of tiles already present
+(there are 2 copies of each tile),
+- numb_jokers jokers replace a tile of a set of the table or go in the hand (only on the table if solvable is
+False: with a joker in the hand you can almost always play),
+- if solvable is True the hand contains a valid set, if it is False the hand is drawn again until you cannot play,
+if it is None the hand is random.
+Whether you can play is checked with array_solver.
+"""
+
+import random
+from collections import namedtuple
+
+from modules import array_solver
+from modules import find_matrix
+
+COLORS = ['b', 'n', 'o', 'r']
+NUMBERS = list(range(1, 14))
+MAX_ATTEMPTS = 200
+
+GameState = namedtuple('GameState', ['table', 'hand', 'solvable'])
+
+# name, number of sets on the table, number of tiles in the hand, duplicates, number of jokers, solvable
+Scenario = namedtuple('Scenario', ['name', 'numb_sets', 'numb_hand', 'duplicates', 'numb_jokers', 'solvable'])
+
+SCENARIOS = [
+    Scenario('small', 3, 4, 0., 0, None),
+    Scenario('small_solvable', 3, 4, 0., 0, True),
+    Scenario('small_unsolvable', 3, 4, 0., 0, False),
+    Scenario('medium_1_joker', 6, 7, .2, 1, None),
+    Scenario('medium_unsolvable', 6, 7, .2, 0, False),
+    Scenario('large_duplicates', 10, 10, .6, 0, None),
+    Scenario('large_2_jokers', 10, 10, .3, 2, None),
+    Scenario('large_unsolvable_1_joker', 10, 6, .3, 1, False),
+]
+
+###########
+## Tiles
+###########
+
+def full_deck()->dict:
+    """
+    Returns a dict with keys the tiles ('j' for the jokers) and values the number of copies in the game.
+    """
+    deck = {str(number) + color: 2 for number in NUMBERS for color in COLORS}
+    deck['j'] = 2
+    return deck
+
+
+def random_set(rng:random.Random, deck:dict, duplicates:float, present:set):
+    """
+    Returns a random valid set (list of tiles) whose tiles are taken from deck, or None if it did not find one.
+    With probability duplicates the set is first looked for among those made of tiles already in present.
+    """
+    want_duplicate = rng.random() < duplicates
+    for attempt in range(2*MAX_ATTEMPTS):
+        if attempt == MAX_ATTEMPTS:
+            want_duplicate = False
+        if rng.random() < .5:
+            color = rng.choice(COLORS)
+            length = rng.randint(3, 5)
+            first = rng.randint(1, 14 - length)
+            candidate = [str(number) + color for number in range(first, first + length)]
+        else:
+            number = rng.choice(NUMBERS)
+            candidate = [str(number) + color for color in rng.sample(COLORS, rng.choice([3, 4]))]
+        if any(deck[card] == 0 for card in candidate):
+            continue
+        if want_duplicate and not all(card in present for card in candidate):
+            continue
+        return candidate
+    return None
+
+
+def take(deck:dict, cards:list):
+    for card in cards:
+        deck[card] -= 1
+
+
+def random_tile(rng:random.Random, deck:dict, duplicates:float, present:set):
+    """
+    Returns a random tile of deck which is not a joker. With probability duplicates, it is a copy of a tile in
+    present (if there is one left).
+    """
+    copies = [card for card in present if card != 'j' and deck[card] > 0]
+    if copies and rng.random() < duplicates:
+        return rng.choice(sorted(copies))
+    return rng.choice([card for card, left in deck.items() if left > 0 and card != 'j'])
+
+
+def can_play(table:list, hand:list)->bool:
+    """
+    Checks with array_solver if you can play.
+    """
+    matrix = find_matrix.from_cards_to_matrix(table + hand, return_pd_dataframe=False, return_sparse=True)
+    found, _ = array_solver.solver(matrix, find_matrix.create_dic_multiplicities(table, diversify_jokers=True))
+    return found
+
+###########
+## States
+###########
+
+def random_table(rng:random.Random, deck:dict, numb_sets:int, duplicates:float, numb_jokers:int,
+                 jokers_in_hand_allowed=True)->(list, int):
+    """
+    Returns the tiles of numb_sets valid sets, taken from deck, and the number of jokers left for the hand.
+    """
+    table = []
+    for _ in range(numb_sets):
+        valid_set = random_set(rng, deck, duplicates, set(table))
+        if valid_set is None:
+            break
+        take(deck, valid_set)
+        table += valid_set
+
+    jokers_in_hand = 0
+    for _ in range(numb_jokers):
+        if table and (not jokers_in_hand_allowed or rng.random() < .5):
+            # the joker replaces a tile of the table, which goes back in the deck
+            k = rng.choice([k for k, card in enumerate(table) if card != 'j'])
+            deck[table[k]] += 1
+            table[k] = 'j'
+            deck['j'] -= 1
+        else:
+            jokers_in_hand += 1
+    return table, jokers_in_hand
+
+
+def solvable_hand(rng:random.Random, deck:dict, table:list, numb_hand:int, duplicates:float):
+    """
+    Returns a hand of numb_hand tiles, taken from deck, containing a valid set (or None if it did not find one).
+    """
+    valid_set = random_set(rng, deck, 0., set())
+    if valid_set is not None and len(valid_set) <= numb_hand:
+        hand = list(valid_set)
+    else:
+        return None
+    take(deck, hand)
+    while len(hand) < numb_hand:
+        card = random_tile(rng, deck, duplicates, set(table + hand))
+        take(deck, [card])
+        hand.append(card)
+    return hand
+
+
+def random_state(rng:random.Random, numb_sets:int, numb_hand:int, duplicates=0., numb_jokers=0, solvable=None):
+    """
+    Returns a GameState as described in the docstring of the module, or None if it did not find one in
+    MAX_ATTEMPTS attempts.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        deck = full_deck()
+        table, jokers_in_hand = random_table(rng, deck, numb_sets, duplicates, numb_jokers,
+                                             jokers_in_hand_allowed=solvable is not False)
+        deck['j'] -= jokers_in_hand
+        numb_random = numb_hand - jokers_in_hand
+        if solvable:
+            hand = solvable_hand(rng, deck, table, numb_random, duplicates)
+            if hand is None:
+                continue
+        else:
+            hand = []
+            for _ in range(numb_random):
+                card = random_tile(rng, deck, duplicates, set(table + hand))
+                take(deck, [card])
+                hand.append(card)
+        hand += ['j']*jokers_in_hand
+        rng.shuffle(hand)
+
+        found = can_play(table, hand)
+        if solvable is None or found == solvable:
+            return GameState(table, hand, found)
+    return None
+
+# Main function
+
+def generate_states(scenario:Scenario, numb_states:int, seed=0)->list:
+    """
+    Returns a list of numb_states GameState of scenario. The same seed gives the same states.
+    """
+    rng = random.Random(str(seed) + scenario.name)
+    states = []
+    while len(states) < numb_states:
+        state = random_state(rng, scenario.numb_sets, scenario.numb_hand, scenario.duplicates,
+                             scenario.numb_jokers, scenario.solvable)
+        if state is None:
+            raise RuntimeError('Could not generate a state for the scenario ' + scenario.name)
+        states.append(state)
+    return states
@@ -0,0 +1,115 @@
+"""
+Main function: measure_decoding. Compares, on a photo of a phone camera (by default a photo of sample_photos
+enlarged to PHOTO_SIZE, 12MP), the time and the peak memory of:
+- 'full': decoding the photo at full resolution (get_info_photo.get_image without max_size),
+- 'reduced': decoding it at image_decoding.CROP_SIZE with DCT scaling, and the image for the detection resized to
+image_decoding.DETECTION_SIZE.
+
+Each mode runs in a new process. The peak memory is the maximum resident memory (sampled every SAMPLING_INTERVAL
+seconds from /proc/self/statm, so linux only) during a run, minus the one before it. The detector itself is not
+run: it needs tensorflow.
+
+python -m benchmarks.photo_decoding [--photo path]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from PIL import Image
+
+PHOTO_SIZE = (4032, 3024)
+SAMPLE_PHOTO = 'sample_photos/27.jpg'
+REPEAT = 5
+
+SAMPLING_INTERVAL = .001
+
+MODE_CODE = """
+import resource
+import threading
+import time
+import numpy as np
+from modules.neural_network_modules import image_decoding
+
+PHOTO = {photo!r}
+
+
+def resident_memory():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1])*resource.getpagesize()
+
+
+def sample_memory(peak, stop):
+    while not stop.is_set():
+        peak[0] = max(peak[0], resident_memory())
+        time.sleep({interval})
+
+
+def full():
+    photo = image_decoding.open_image(PHOTO)
+    return np.asarray(photo)
+
+
+def reduced():
+    photo = image_decoding.open_image(PHOTO, True, image_decoding.CROP_SIZE)
+    image_np = np.asarray(photo)
+    return image_np, np.asarray(image_decoding.resize_image(photo, image_decoding.DETECTION_SIZE))
+
+
+seconds = []
+peaks = []
+for _ in range({repeat}):
+    before = resident_memory()
+    peak, stop = [before], threading.Event()
+    sampler = threading.Thread(target=sample_memory, args=(peak, stop))
+    sampler.start()
+    start = time.perf_counter()
+    {mode}()
+    seconds.append(time.perf_counter() - start)
+    stop.set()
+    sampler.join()
+    peaks.append(peak[0] - before)
+print(min(seconds), max(peaks))
+"""
+
+
+def run_mode(photo, mode, repeat=REPEAT)->dict:
+    """
+    Runs mode ('full' or 'reduced') repeat times in a new process. Returns the best time and the largest peak
+    memory (MB) of the runs.
+    """
+    code = MODE_CODE.format(photo=photo, repeat=repeat, mode=mode, interval=SAMPLING_INTERVAL)
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    seconds, peak = output.split()[-2:]
+    return {'seconds': float(seconds), 'peak_memory_mb': int(peak)/2**20}
+
+
+def enlarged_sample(directory, size=PHOTO_SIZE)->str:
+    path = os.path.join(directory, 'photo.jpg')
+    Image.open(SAMPLE_PHOTO).convert('RGB').resize(size, Image.BICUBIC).save(path, quality=90)
+    return path
+
+# Main function
+
+def measure_decoding(photo=None, repeat=REPEAT)->dict:
+    """
+    Returns a dict with the 'seconds' and the 'peak_memory_mb' of the modes 'full' and 'reduced' on photo (a path;
+    None for a sample photo enlarged to PHOTO_SIZE).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        if photo is None:
+            photo = enlarged_sample(directory)
+        photo_size = Image.open(photo).size
+        results = {mode: run_mode(photo, mode, repeat) for mode in ['full', 'reduced']}
+    return dict(results, photo_size=photo_size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time and memory of decoding a photo at reduced resolution.')
+    parser.add_argument('--photo', help='JPEG photo (default: a sample photo enlarged to 12MP)')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    args = parser.parse_args()
+    print(json.dumps(measure_decoding(args.photo, args.repeat), indent=2))
@@ -0,0 +1,212 @@
+"""
+Main function: run_benchmarks. Times the stages of the solver on the states of game_states.SCENARIOS:
+- 'from_cards_to_matrix': find_matrix.from_cards_to_matrix(table + hand),
+- 'valid_same_color_sets', 'valid_same_number_sets': the calls of find_admissible_sets made by
+from_cards_to_matrix, for all the colors (numbers) present,
+- 'solver': solver.solver on the matrix (the engine is a parameter).
+For each scenario and stage it reports the wall time (total over the states, the best of repeat runs), the peak
+memory (measured with tracemalloc in a separate run, so that it does not slow down the timings), and for the solver
+the number of nodes of the search of the engine measured (counted by solver.solve_with_budget with no limits, in a
+separate run).
+
+The results are a dict which can be saved as JSON and compared with a saved baseline:
+
+python -m benchmarks.run_benchmarks --output results.json
+python -m benchmarks.run_benchmarks --baseline results.json
+
+Run it from the root of the repo. The order of the rows of the matrix, hence the nodes of the search, depends on
+the hashes of the strings: the script runs itself again with PYTHONHASHSEED=HASH_SEED if it is not set, so that
+the node counts can be compared between runs.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import game_states
+from modules import find_admissible_sets as admissible_sets
+from modules import find_matrix
+from modules import solver
+
+STAGES = ['from_cards_to_matrix', 'valid_same_color_sets', 'valid_same_number_sets', 'solver']
+# a stage is slower than in the baseline if it takes more than REGRESSION_THRESHOLD times as long
+REGRESSION_THRESHOLD = 1.2
+HASH_SEED = '0'
+
+###########
+## Stages
+###########
+
+def stage_inputs(state:game_states.GameState)->dict:
+    """
+    Returns the inputs of the stages for state, computed once so that they are not timed.
+    """
+    cards = state.table + state.hand
+    numb_jokers = cards.count('j')
+    without_jokers = [card for card in cards if card != 'j']
+    same_color = find_matrix.same_color_dict(without_jokers)
+    return {'cards': cards,
+            'numb_jokers': numb_jokers,
+            'colors': [admissible_sets.drop_color_from_list(same_color[color]) for color in same_color],
+            'numbers': list(find_matrix.same_number_dict(without_jokers).values()),
+            'matrix': find_matrix.from_cards_to_matrix(cards),
+            'cards_on_table': find_matrix.create_dic_multiplicities(state.table, diversify_jokers=True)}
+
+
+def run_stage(stage:str, inputs:dict, engine='dataframe'):
+    if stage == 'from_cards_to_matrix':
+        return find_matrix.from_cards_to_matrix(inputs['cards'])
+    if stage == 'valid_same_color_sets':
+        return [admissible_sets.valid_same_color_sets(cards, inputs['numb_jokers']) for cards in inputs['colors']]
+    if stage == 'valid_same_number_sets':
+        return [admissible_sets.valid_same_number_sets(cards, inputs['numb_jokers']) for cards in inputs['numbers']]
+    return solver.solver(inputs['matrix'], inputs['cards_on_table'], engine=engine)
+
+
+def time_stage(stage:str, all_inputs:list, engine:str, repeat:int)->float:
+    """
+    Seconds to run stage on all the inputs, the best of repeat runs.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for inputs in all_inputs:
+            run_stage(stage, inputs, engine)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory_stage(stage:str, all_inputs:list, engine:str)->int:
+    """
+    Largest peak memory (in bytes, measured by tracemalloc) to run stage on one of the inputs.
+    """
+    peak = 0
+    for inputs in all_inputs:
+        tracemalloc.start()
+        run_stage(stage, inputs, engine)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peak
+
+
+def count_nodes(all_inputs:list, engine:str)->int:
+    """
+    Nodes visited by the search of engine on all the inputs.
+    """
+    nodes = 0
+    for inputs in all_inputs:
+        result = solver.solve_with_budget(inputs['matrix'], inputs['cards_on_table'], engine=engine)
+        nodes += result.info['nodes']
+    return nodes
+
+###########
+## Baseline
+###########
+
+def compare(results:dict, baseline:dict, threshold=REGRESSION_THRESHOLD)->list:
+    """
+    Returns a list of dicts, one for each scenario and stage in both results and baseline, with the ratio between
+    the times (and the peak memories) and whether it is a regression. The node counts are compared too if both were
+    counted with the same engine: with the same seed, the same scenarios and the same PYTHONHASHSEED they change
+    only if the search changed.
+    """
+    comparison = []
+    for name, scenario in results['scenarios'].items():
+        old_scenario = baseline['scenarios'].get(name)
+        if old_scenario is None:
+            continue
+        for stage, values in scenario['stages'].items():
+            old_values = old_scenario['stages'].get(stage)
+            if old_values is None:
+                continue
+            time_ratio = values['seconds']/old_values['seconds'] if old_values['seconds'] > 0 else float('inf')
+            memory_ratio = (values['peak_memory']/old_values['peak_memory'] if old_values['peak_memory'] > 0
+                            else float('inf'))
+            comparison.append({'scenario': name, 'stage': stage, 'time_ratio': time_ratio,
+                               'memory_ratio': memory_ratio,
+                               'regression': time_ratio > threshold or memory_ratio > threshold})
+        hash_seed = results['meta'].get('hash_seed')
+        same_search = (hash_seed is not None and hash_seed == baseline['meta'].get('hash_seed')
+                       and results['meta']['engine'] == baseline['meta'].get('engine'))
+        if same_search and scenario['nodes'] != old_scenario['nodes']:
+            comparison.append({'scenario': name, 'stage': 'nodes', 'old_nodes': old_scenario['nodes'],
+                               'nodes': scenario['nodes'], 'regression': scenario['nodes'] > old_scenario['nodes']})
+    return comparison
+
+
+def print_comparison(comparison:list):
+    for row in comparison:
+        flag = 'REGRESSION' if row['regression'] else ''
+        if row['stage'] == 'nodes':
+            print('{:28s} {:24s} {} -> {} {}'.format(row['scenario'], 'nodes', row['old_nodes'], row['nodes'], flag))
+        else:
+            print('{:28s} {:24s} time x{:.2f} memory x{:.2f} {}'.format(row['scenario'], row['stage'],
+                                                                      row['time_ratio'], row['memory_ratio'], flag))
+
+# Main function
+
+def run_benchmarks(numb_states=10, seed=0, repeat=3, engine='dataframe', scenarios=None,
+                   print_progress=False)->dict:
+    """
+    Input: numb_states is the number of states of each scenario, seed the seed of game_states.generate_states,
+    repeat the number of timed runs of each stage (the best one is kept), engine the engine of solver.solver,
+    scenarios a list of game_states.Scenario (default game_states.SCENARIOS).
+
+    Returns: dict with the parameters in 'meta' and for each scenario in 'scenarios' the number of states, how
+    many are solvable, the nodes of the search and for each stage the seconds and the peak memory in bytes.
+    """
+    if scenarios is None:
+        scenarios = game_states.SCENARIOS
+    results = {'meta': {'numb_states': numb_states, 'seed': seed, 'repeat': repeat, 'engine': engine,
+                        'hash_seed': os.environ.get('PYTHONHASHSEED'), 'python': platform.python_version(),
+                        'numpy': np.__version__, 'pandas': pd.__version__},
+               'scenarios': {}}
+    for scenario in scenarios:
+        states = game_states.generate_states(scenario, numb_states, seed)
+        all_inputs = [stage_inputs(state) for state in states]
+        stages = {}
+        for stage in STAGES:
+            stages[stage] = {'seconds': time_stage(stage, all_inputs, engine, repeat),
+                             'peak_memory': peak_memory_stage(stage, all_inputs, engine)}
+        results['scenarios'][scenario.name] = {'states': len(states),
+                                               'solvable': sum(state.solvable for state in states),
+                                               'nodes': count_nodes(all_inputs, engine),
+                                               'stages': stages}
+        if print_progress:
+            print(scenario.name, {stage: round(values['seconds'], 4) for stage, values in stages.items()})
+    return results
+
+
+if __name__ == '__main__':
+    if os.environ.get('PYTHONHASHSEED') is None:
+        os.execve(sys.executable, [sys.executable, '-m', 'benchmarks.run_benchmarks'] + sys.argv[1:],
+                  dict(os.environ, PYTHONHASHSEED=HASH_SEED))
+    parser = argparse.ArgumentParser(description='Benchmarks of the solver.')
+    parser.add_argument('--states', type=int, default=10, help='number of states of each scenario')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of each stage, the best is kept')
+    parser.add_argument('--engine', default='dataframe', choices=solver.ENGINES)
+    parser.add_argument('--output', help='save the results in this JSON file')
+    parser.add_argument('--baseline', help='compare the results with this JSON file')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.states, args.seed, args.repeat, args.engine, print_progress=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f), args.threshold)
+        print_comparison(comparison)
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
@@ -0,0 +1,79 @@
+"""
+Main function: measure_startup. Times Rummikub_main.py with the tiles given as text (--table, --hand), from the
+start of a new python process to the answer, and checks that the solver path does not import any of
+HEAVY_MODULES.
+
+python -m benchmarks.startup
+
+exits with 1 if the median time is above STARTUP_LIMIT seconds or if a heavy module was imported. Run it from the
+root of the repo.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+MAIN = 'Rummikub_main.py'
+ARGUMENTS = ['--table', '3b,4b,5b,7r,7n,7o,10b,11b,12b,j', '--hand', '6b,2r,7b,13b,1n']
+HEAVY_MODULES = ['tensorflow', 'matplotlib', 'PIL', 'multiprocessing']
+# the median time from the start of the process to the answer must be below STARTUP_LIMIT seconds
+STARTUP_LIMIT = 1.
+
+# runs Rummikub_main.py in the process, then prints the heavy modules imported
+IMPORTED_MODULES = """
+import json, runpy, sys
+sys.argv = [{main!r}] + {arguments!r}
+runpy.run_path({main!r}, run_name='__main__')
+print('IMPORTED', json.dumps([module for module in {heavy!r} if module in sys.modules]))
+"""
+
+
+def time_startup(arguments=ARGUMENTS)->float:
+    """
+    Seconds to run Rummikub_main.py with arguments in a new python process.
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, MAIN] + arguments, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def heavy_modules_imported(arguments=ARGUMENTS)->list:
+    """
+    The modules of HEAVY_MODULES imported by Rummikub_main.py with arguments.
+    """
+    code = IMPORTED_MODULES.format(main=MAIN, arguments=arguments, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    line = [line for line in output.splitlines() if line.startswith('IMPORTED')][-1]
+    return json.loads(line[len('IMPORTED '):])
+
+# Main function
+
+def measure_startup(repeat=5, arguments=ARGUMENTS)->dict:
+    """
+    Returns a dict with the times of repeat runs ('seconds'), their 'median' and 'min', and the 'heavy_modules'
+    imported.
+    """
+    seconds = [time_startup(arguments) for _ in range(repeat)]
+    return {'seconds': seconds,
+            'median': statistics.median(seconds),
+            'min': min(seconds),
+            'heavy_modules': heavy_modules_imported(arguments)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Startup time of Rummikub_main.py with the tiles as text.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--limit', type=float, default=STARTUP_LIMIT, help='maximum median time in seconds')
+    args = parser.parse_args()
+
+    results = measure_startup(args.repeat)
+    print(json.dumps(results, indent=2))
+    if results['heavy_modules']:
+        print('The solver path imports', ', '.join(results['heavy_modules']))
+        sys.exit(1)
+    if results['median'] > args.limit:
+        print('The median startup time', round(results['median'], 3), 's is above', args.limit, 's')
+        sys.exit(1)
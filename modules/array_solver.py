@@ -0,0 +1,391 @@
+"""
+Main function: solver. Same contract as solver.solver (it returns True, winning set or False, []), but the
+search does not drop rows and columns of a pd.DataFrame at every node.
+
+The matrix is read once into fixed arrays:
+- row_cols[i]: the columns of the cards in the valid set at row i,
+- col_masks[j]: a bitmask (python int) with bit i set iff the card at column j belongs to the valid set at row i,
+- multiplicities[j]: how many copies of the card at column j there are (table + hand).
+
+The live rows are a bitmask as well. Taking a valid set decreases the remaining copies of its cards, and when no
+copies of a card are left all the rows containing it are removed from the live rows. To backtrack we restore the
+live rows we saved before taking the set and increase the remaining copies again.
+
+The search is the same as in solver.solver: same choice of the next card and same order of the valid sets, so the
+two functions explore the same tree and return the same winning set. With a transposition table, the positions
+already known to be lost are skipped.
+"""
+
+import numpy as np
+import pandas as pd
+
+from modules import find_matrix
+from modules import search_budget
+from modules import transposition_table as transposition
+
+
+class SearchInterrupted(Exception):
+    """
+    Raised by ArraySearch.search when should_stop returns True.
+    """
+    pass
+
+
+def iterate_bits(mask:int):
+    """
+    Auxiliary. Yields the indices of the bits set in mask, from the lowest.
+
+    Example: 0b10110 --> 1, 2, 4
+    """
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+def matrix_to_arrays(current_matrix)->(list, list, np.ndarray):
+    """
+    Input: current_matrix as in solver.solver, or the same matrix as a find_matrix.SparseMatrix.
+    Returns: columns (the cards), row_cols (for each row the indices of the columns of its cards) and
+    multiplicities (for each column the number of copies of the card).
+    """
+    if isinstance(current_matrix, find_matrix.SparseMatrix):
+        indptr, indices, data, columns = current_matrix
+        row_cols = [indices[indptr[i]:indptr[i+1]] for i in range(len(indptr) - 1)]
+        multiplicities = np.zeros(len(columns), dtype=np.int64)
+        multiplicities[indices] = data
+        return list(columns), row_cols, multiplicities
+    values = current_matrix.to_numpy()
+    row_cols = [np.flatnonzero(row > 0) for row in values]
+    if values.shape[0]:
+        multiplicities = values.max(axis=0).astype(np.int64)
+    else:
+        multiplicities = np.zeros(values.shape[1], dtype=np.int64)
+    return list(current_matrix.columns), row_cols, multiplicities
+
+
+class ArraySearch:
+    """
+    State of the search on a fixed matrix. Use from_dataframe to build it from the output of
+    find_matrix.from_cards_to_matrix.
+
+    columns is the list of cards, row_cols a list with, for each valid set, the indices of its cards in columns,
+    multiplicities[j] the number of copies of columns[j], cards_on_table a dic as in solver.solver.
+    """
+    def __init__(self, columns:list, row_cols:list, multiplicities:list, cards_on_table:dict):
+        self.columns = list(columns)
+        self.row_cols = [[int(j) for j in cols] for cols in row_cols]
+        self.row_sets = [[self.columns[j] for j in cols] for cols in self.row_cols]
+        self.multiplicities = np.array(multiplicities, dtype=np.int64)
+
+        col_masks = [0]*len(self.columns)
+        for i, cols in enumerate(self.row_cols):
+            for j in cols:
+                col_masks[j] |= 1 << i
+        self.col_masks = col_masks
+        self.all_rows = (1 << len(self.row_cols)) - 1
+        self.free_rows = []
+
+        col_index = {card: j for j, card in enumerate(self.columns)}
+        self.table_counts = [0]*len(self.columns)
+        self.missing_table_card = False
+        self.table_cols = []
+        for card, multiplicity in cards_on_table.items():
+            if card not in col_index:
+                # a card on the table which belongs to no valid set
+                self.missing_table_card = True
+                continue
+            self.table_cols.append(col_index[card])
+            self.table_counts[col_index[card]] = multiplicity
+        self.transposition_table = None
+        self.slots = None
+        self.should_stop = None
+        self.stop_check_interval = 256
+        self.stop_at_node = None
+        self.budget = None
+        self.reset()
+
+    @classmethod
+    def from_dataframe(cls, current_matrix:pd.DataFrame, cards_on_table:dict):
+        """
+        current_matrix as in solver.solver, or a find_matrix.SparseMatrix
+        """
+        columns, row_cols, multiplicities = matrix_to_arrays(current_matrix)
+        return cls(columns, row_cols, multiplicities, cards_on_table)
+
+    def reset(self):
+        """
+        Back to the starting position: no set taken.
+        """
+        self.live = self.all_rows
+        self.remaining = [int(m) for m in self.multiplicities]
+        self.table_needed = list(self.table_counts)
+        self.table_left = sum(self.table_counts[j] for j in self.table_cols)
+        self.taken_from_hand = 0
+        self.sets_taken = []
+        self.nodes = 0
+        self.budget_table_left = self.table_left + 1
+
+    ## Moves
+
+    def take(self, row:int)->int:
+        """
+        Takes the valid set at row. Returns the live rows before taking it, to be passed to undo.
+        """
+        old_live = self.live
+        for j in self.row_cols[row]:
+            self.remaining[j] -= 1
+            if self.table_needed[j] > 0:
+                self.table_needed[j] -= 1
+                self.table_left -= 1
+            else:
+                self.taken_from_hand += 1
+            if self.remaining[j] == 0:
+                self.live &= ~self.col_masks[j]
+        self.sets_taken.append(row)
+        return old_live
+
+    def undo(self, row:int, old_live:int):
+        """
+        Undoes take(row).
+        """
+        self.sets_taken.pop()
+        for j in self.row_cols[row]:
+            self.remaining[j] += 1
+            if self.multiplicities[j] - self.remaining[j] < self.table_counts[j]:
+                self.table_needed[j] += 1
+                self.table_left += 1
+            else:
+                self.taken_from_hand -= 1
+        self.live = old_live
+
+    ## Operations with the matrix
+
+    def choose_card(self)->(bool, int):
+        """
+        As operations.choose_card, but returns the column of the card. If there is a card on the table which
+        belongs to no live set returns True, column. Otherwise False, column of the card that belongs to the least
+        number of live sets.
+        """
+        min_, min_col = 9999999, -1
+        for j in self.table_cols:
+            if self.table_needed[j] == 0:
+                continue
+            c_val = (self.col_masks[j] & self.live).bit_count()
+            if c_val == 0:
+                return True, j
+            if c_val < min_:
+                min_ = c_val
+                min_col = j
+        return False, min_col
+
+    def rows_with_card(self, col:int)->list:
+        """
+        Live rows containing the card at column col, in the order of the matrix.
+        """
+        return list(iterate_bits(self.col_masks[col] & self.live))
+
+    def winning_set(self)->list:
+        return [list(self.row_sets[row]) for row in self.sets_taken]
+
+    def state_key(self)->bytes:
+        """
+        Key of the current position in the transposition table.
+        """
+        hand_remaining = [r - t for r, t in zip(self.remaining, self.table_needed)]
+        return transposition.encode_state(self.slots, self.table_needed, hand_remaining, self.taken_from_hand > 0)
+
+    ## Changes of the matrix
+
+    # Used by game_session.GameSession to change the matrix between two searches instead of building it again.
+    # They take effect at the next reset (solve calls it). A removed row keeps its index, with no cards and out of
+    # all_rows, and add_rows reuses it.
+
+    def add_rows(self, row_cols:list)->list:
+        """
+        Adds the valid sets of row_cols (as in __init__). Returns their rows.
+        """
+        rows = []
+        for cols in row_cols:
+            cols = [int(j) for j in cols]
+            if self.free_rows:
+                row = self.free_rows.pop()
+                self.row_cols[row] = cols
+                self.row_sets[row] = [self.columns[j] for j in cols]
+            else:
+                row = len(self.row_cols)
+                self.row_cols.append(cols)
+                self.row_sets.append([self.columns[j] for j in cols])
+            for j in cols:
+                self.col_masks[j] |= 1 << row
+            self.all_rows |= 1 << row
+            rows.append(row)
+        return rows
+
+    def remove_rows(self, rows:list):
+        for row in rows:
+            for j in self.row_cols[row]:
+                self.col_masks[j] &= ~(1 << row)
+            self.all_rows &= ~(1 << row)
+            self.row_cols[row] = []
+            self.row_sets[row] = []
+            self.free_rows.append(row)
+
+    def set_multiplicity(self, col:int, multiplicity:int):
+        self.multiplicities[col] = multiplicity
+
+    def set_table_count(self, col:int, count:int):
+        """
+        count copies of the card at column col are on the table.
+        """
+        self.table_counts[col] = count
+        if count > 0 and col not in self.table_cols:
+            self.table_cols.append(col)
+        elif count == 0 and col in self.table_cols:
+            self.table_cols.remove(col)
+
+    ## Search
+
+    def search(self)->bool:
+        """
+        Steps 1-4 of solver.solver, starting from the current state. If it returns True, the winning set is in
+        self.sets_taken.
+        If should_stop is a function, it is called every stop_check_interval nodes and at the node stop_at_node,
+        and if it returns True the search raises SearchInterrupted. If budget is a search_budget.SearchBudget, the
+        best partial arrangement is recorded in it.
+        """
+        self.nodes += 1
+        if self.should_stop is not None and (self.nodes % self.stop_check_interval == 0
+                                             or self.nodes == self.stop_at_node) and self.should_stop():
+            raise SearchInterrupted()
+        if self.budget is not None and self.table_left < self.budget_table_left:
+            self.budget_table_left = self.table_left
+            self.budget.record_partial(self.table_left, self.winning_set())
+
+        ## table is empty
+        if self.table_left == 0:
+            if self.taken_from_hand:
+                return True
+            return self.live != 0
+
+        ## table is not empty
+        already_lost, next_col = self.choose_card()
+        if already_lost:
+            return False
+
+        key = None
+        if self.transposition_table is not None:
+            key = self.state_key()
+            if self.transposition_table.is_failure(key):
+                return False
+
+        for row in self.rows_with_card(next_col):
+            old_live = self.take(row)
+            if self.search():
+                return True
+            self.undo(row, old_live)
+
+        if key is not None:
+            self.transposition_table.add_failure(key)
+        return False
+
+    def use_budget(self, budget):
+        """
+        The search stops when the search_budget.SearchBudget budget is exhausted (see search), and records its best
+        partial arrangement in it.
+        """
+        self.budget = budget
+        self.should_stop = lambda: budget.exhausted(self.nodes)
+        self.stop_check_interval = search_budget.CHECK_INTERVAL
+        self.stop_at_node = budget.node_limit
+
+    def solve(self, transposition_table=None)->(bool, list):
+        """
+        transposition_table is None or a transposition_table.TranspositionTable, possibly shared with other solves.
+        """
+        self.transposition_table = transposition_table
+        if transposition_table is not None and self.slots is None:
+            self.slots = transposition.card_slots(self.columns)
+        self.reset()
+        if self.missing_table_card:
+            return False, []
+        if self.search():
+            return True, self.winning_set()
+        return False, []
+
+    def iter_solutions(self, limit=None):
+        """
+        Generator: yields every way to play (a list of sets, as the winning set of solve), each one once, as soon
+        as it is found. Stops after limit of them if limit is not None.
+
+        The search goes through the whole tree instead of stopping at the first solution, with an explicit stack
+        instead of recursion: a frame is [(valid set, first row) to try, index of the next one, set taken to get to
+        the frame, live rows before taking it]. Sets are taken and given back in place.
+        While there are cards on the table, we branch as solver.solver does. Once the table is empty, the
+        arrangement is a way to play if it uses tiles of the hand, and we go on adding sets made of tiles of the
+        hand, as optimizer does: in the order of the rows (a set can be taken again, if there are copies of its
+        tiles left), so that each combination of them is found once.
+        """
+        self.reset()
+        if self.missing_table_card or limit == 0:
+            return
+        seen = set()
+        numb_found = 0
+        stack = [[None, 0, None, None]]
+        first_rows = [0]
+        while stack:
+            frame = stack[-1]
+            if frame[0] is None:
+                # first visit of the node: is it a solution, or which sets to try next?
+                self.nodes += 1
+                if self.should_stop is not None and (self.nodes % self.stop_check_interval == 0
+                                                     or self.nodes == self.stop_at_node) and self.should_stop():
+                    raise SearchInterrupted()
+                frame[0] = []
+                if self.table_left == 0:
+                    if self.taken_from_hand:
+                        key = tuple(sorted(self.sets_taken))
+                        if key not in seen:
+                            seen.add(key)
+                            yield self.winning_set()
+                            numb_found += 1
+                            if limit is not None and numb_found >= limit:
+                                return
+                    frame[0] = [(row, row) for row in iterate_bits(self.live) if row >= first_rows[-1]]
+                else:
+                    already_lost, next_col = self.choose_card()
+                    if not already_lost:
+                        frame[0] = [(row, 0) for row in self.rows_with_card(next_col)]
+
+            if frame[1] < len(frame[0]):
+                row, first_row = frame[0][frame[1]]
+                frame[1] += 1
+                old_live = self.take(row)
+                stack.append([None, 0, row, old_live])
+                first_rows.append(first_row)
+            else:
+                stack.pop()
+                first_rows.pop()
+                if frame[2] is not None:
+                    self.undo(frame[2], frame[3])
+
+
+# Main function
+
+def solver(current_matrix:pd.DataFrame, cards_on_table:dict, transposition_table=None)->(bool, list):
+    """
+    current_matrix and cards_on_table as in solver.solver (current_matrix can also be the same matrix as a
+    find_matrix.SparseMatrix, from from_cards_to_matrix(cards, return_pd_dataframe=False, return_sparse=True)).
+    Returns True, winning set if you can play,
+    False, [] otherwise.
+    """
+    return ArraySearch.from_dataframe(current_matrix, cards_on_table).solve(transposition_table)
+
+
+def iter_solutions(current_matrix:pd.DataFrame, cards_on_table:dict, limit=None):
+    """
+    current_matrix and cards_on_table as in solver. Generator of all the ways to play, see ArraySearch.iter_solutions.
+
+    Example: for winning_set in iter_solutions(matrix, dic_cards_on_table, limit=10): print(winning_set)
+    """
+    return ArraySearch.from_dataframe(current_matrix, cards_on_table).iter_solutions(limit)
@@ -0,0 +1,149 @@
+"""
+Main function: solve_batch. Solves many positions (tiles on the table, tiles in the hand) at once.
+
+All the positions share the catalog of set_catalog: the matrix of a position is a filter of it. The positions are
+processed in chunks of chunk_size, and for each chunk the cheap checks are done with numpy for all the positions
+together:
+- which sets of the catalog can be formed with the tiles of each position,
+- if there are no tiles in the hand, or a tile on the table belongs to none of these sets, you cannot play and the
+position is not searched.
+The other positions are searched one by one with array_solver (or dlx_solver). With processes > 1 the chunks are
+spread over a process pool. The results are returned in the order of the positions.
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+
+from modules import array_solver
+from modules import dlx_solver
+from modules import find_matrix
+from modules import set_catalog
+
+ENGINES = ['array', 'dlx']
+
+# incidence matrix (numb sets, numb tiles) of each catalog loaded
+_incidences = {}
+
+
+def catalog_incidence(catalog:dict)->np.ndarray:
+    """
+    Returns a bool array (numb sets, len(CATALOG_CARDS)), True iff the tile is in the set.
+    """
+    key = id(catalog)
+    if key not in _incidences:
+        bits = np.arange(len(set_catalog.CATALOG_CARDS), dtype=np.uint64)
+        _incidences[key] = ((np.asarray(catalog['set_masks'])[:, None] >> bits) & np.uint64(1)).astype(bool)
+    return _incidences[key]
+
+
+def encode_position(cards_on_table:list, cards_on_hand:list)->(dict, dict, int, int):
+    """
+    Input: two lists of strings, jokers as 'j'.
+    Returns: card_mult (multiplicities of table + hand, jokers as 'jb', 'jr', as in find_matrix.from_cards_to_matrix),
+    the dic of the cards on the table (as find_matrix.create_dic_multiplicities(cards_on_table, diversify_jokers=True)),
+    and the bitmasks of the tiles present and of the tiles on the table.
+    """
+    card_mult = find_matrix.create_dic_multiplicities(cards_on_table + cards_on_hand)
+    numb_jokers = card_mult.pop('j', 0)
+    if numb_jokers >= 1:
+        card_mult['jb'] = 1
+    if numb_jokers >= 2:
+        card_mult['jr'] = 1
+    dic_cards_on_table = find_matrix.create_dic_multiplicities(cards_on_table, diversify_jokers=True)
+    return (card_mult, dic_cards_on_table, set_catalog.cards_to_mask(card_mult.keys()),
+            set_catalog.cards_to_mask(dic_cards_on_table.keys()))
+
+
+def feasible_sets(present_masks:np.ndarray, table_masks:np.ndarray, has_hand:np.ndarray, catalog:dict):
+    """
+    Input: present_masks, table_masks are uint64 arrays with one bitmask for each position, has_hand a bool array.
+    Returns: live, a bool array (numb positions, numb sets), True iff the set can be formed in the position, and
+    feasible, a bool array, False for the positions where you surely cannot play.
+    """
+    set_masks = np.asarray(catalog['set_masks'])
+    live = (set_masks[None, :] & ~present_masks[:, None]) == 0
+    covered = live.astype(np.int32) @ catalog_incidence(catalog).astype(np.int32) > 0
+    bits = np.arange(len(set_catalog.CATALOG_CARDS), dtype=np.uint64)
+    on_table = ((table_masks[:, None] >> bits) & np.uint64(1)).astype(bool)
+    feasible = has_hand & ~np.any(on_table & ~covered, axis=1)
+    return live, feasible
+
+
+def solve_chunk(chunk:list, engine='array')->(list, int):
+    """
+    Input: chunk is a list of (cards_on_table, cards_on_hand).
+    Returns: the list of the results (bool, winning set) and the number of positions discarded by feasible_sets.
+    """
+    catalog = set_catalog.load_catalog()
+    encoded = [encode_position(list(table), list(hand)) for table, hand in chunk]
+    present_masks = np.array([e[2] for e in encoded], dtype=np.uint64)
+    table_masks = np.array([e[3] for e in encoded], dtype=np.uint64)
+    has_hand = np.array([len(hand) > 0 for _, hand in chunk], dtype=bool)
+    live, feasible = feasible_sets(present_masks, table_masks, has_hand, catalog)
+
+    results = []
+    for k, (card_mult, dic_cards_on_table, _, _) in enumerate(encoded):
+        if not feasible[k]:
+            results.append((False, []))
+            continue
+        matrix = set_catalog.matrix_from_catalog(card_mult, return_pd_dataframe=False, return_sparse=True,
+                                                 catalog=catalog, set_ids=np.flatnonzero(live[k]))
+        if engine == 'dlx':
+            results.append(dlx_solver.solver(matrix, dic_cards_on_table))
+        else:
+            results.append(array_solver.solver(matrix, dic_cards_on_table))
+    return results, int(np.sum(~feasible))
+
+
+def _solve_chunk_with_engine(args):
+    return solve_chunk(*args)
+
+
+def chunks(positions, chunk_size:int):
+    chunk = []
+    for position in positions:
+        chunk.append(position)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Main function
+
+def solve_batch(positions, processes=1, chunk_size=256, engine='array', stats=None)->list:
+    """
+    Input: positions is an iterable of (cards_on_table, cards_on_hand), two lists of strings like
+    ['3b', '4b', 'j'] (jokers as 'j'). processes is the number of processes (1: no process pool), engine one of
+    ENGINES. If stats is a dict, the number of positions, the seconds spent, the positions per second and the
+    positions discarded by the numpy checks are written in it.
+
+    Returns: list with, for each position, True, winning set if you can play, False, [] otherwise.
+    """
+    if engine not in ENGINES:
+        raise ValueError('engine must be one of ' + str(ENGINES) + ', got ' + str(engine))
+    start = time.perf_counter()
+    set_catalog.load_catalog()
+    tasks = ((chunk, engine) for chunk in chunks(positions, chunk_size))
+
+    results, discarded = [], 0
+    if processes == 1:
+        outputs = map(_solve_chunk_with_engine, tasks)
+        for chunk_results, chunk_discarded in outputs:
+            results += chunk_results
+            discarded += chunk_discarded
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            for chunk_results, chunk_discarded in pool.imap(_solve_chunk_with_engine, tasks):
+                results += chunk_results
+                discarded += chunk_discarded
+
+    if stats is not None:
+        seconds = time.perf_counter() - start
+        stats['positions'] = len(results)
+        stats['seconds'] = seconds
+        stats['positions_per_second'] = len(results)/seconds if seconds > 0 else float('inf')
+        stats['discarded'] = discarded
+    return results
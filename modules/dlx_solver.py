@@ -0,0 +1,298 @@
+"""
+Main function: solver. Dancing Links (Knuth's Algorithm X with doubly linked lists) on the matrix of
+find_matrix.from_cards_to_matrix, with generalized columns to handle cards appearing twice:
+- each card has a column with a capacity, the number of copies of the card (table + hand). Once all of them are
+taken the column is covered, i.e. all the rows containing the card are unlinked from the other columns.
+- the cards on the table are primary columns with a required count, the number of copies on the table. A primary
+column leaves the list of the columns to satisfy as soon as this many copies are taken.
+- the cards only in the hand are secondary columns: they have a capacity but nothing is required.
+
+When all the primary columns are satisfied we need to have used at least one tile from the hand. If we did not,
+every row still linked only contains tiles of the hand, so we take the first one of them.
+
+Taking a set and backtracking only change pointers, nothing is copied. With a transposition table, the positions
+already known to be lost are skipped.
+"""
+
+import pandas as pd
+
+from modules import array_solver
+from modules import transposition_table as transposition
+
+
+class DancingLinks:
+    """
+    columns, row_cols, multiplicities as in array_solver.ArraySearch, cards_on_table a dic as in solver.solver.
+
+    Node 0 is the root, node j+1 the header of the column j, the other nodes are the 1s of the matrix.
+    """
+    def __init__(self, columns:list, row_cols:list, multiplicities:list, cards_on_table:dict):
+        self.columns = list(columns)
+        self.row_sets = [[self.columns[int(j)] for j in cols] for cols in row_cols]
+        self.multiplicities = [int(m) for m in multiplicities]
+
+        numb_cols = len(self.columns)
+        col_index = {card: j for j, card in enumerate(self.columns)}
+        self.table_counts = [0]*(numb_cols + 1)
+        self.missing_table_card = False
+        for card, multiplicity in cards_on_table.items():
+            if card not in col_index:
+                self.missing_table_card = True
+                continue
+            self.table_counts[col_index[card] + 1] = multiplicity
+
+        # headers
+        self.L = list(range(numb_cols + 1))
+        self.R = list(range(numb_cols + 1))
+        self.U = list(range(numb_cols + 1))
+        self.D = list(range(numb_cols + 1))
+        self.C = list(range(numb_cols + 1))
+        self.ROW = [-1]*(numb_cols + 1)
+        self.S = [0]*(numb_cols + 1)
+        self.capacity = [0] + self.multiplicities
+
+        # rows
+        for row, cols in enumerate(row_cols):
+            first = None
+            for j in cols:
+                c = int(j) + 1
+                node = len(self.C)
+                self.C.append(c)
+                self.ROW.append(row)
+                self.U.append(self.U[c])
+                self.D.append(c)
+                self.D[self.U[c]] = node
+                self.U[c] = node
+                self.S[c] += 1
+                if first is None:
+                    first = node
+                    self.L.append(node)
+                    self.R.append(node)
+                else:
+                    self.L.append(self.L[first])
+                    self.R.append(first)
+                    self.R[self.L[first]] = node
+                    self.L[first] = node
+        self.transposition_table = None
+        self.slots = None
+        self.should_stop = None
+        self.stop_check_interval = 256
+        self.stop_at_node = None
+        self.reset()
+
+    @classmethod
+    def from_dataframe(cls, current_matrix:pd.DataFrame, cards_on_table:dict):
+        columns, row_cols, multiplicities = array_solver.matrix_to_arrays(current_matrix)
+        return cls(columns, row_cols, multiplicities, cards_on_table)
+
+    def reset(self):
+        """
+        Links the primary columns to the root, in the order of the columns, and sets the counters.
+        """
+        primary = [c for c in range(1, len(self.capacity)) if self.table_counts[c] > 0]
+        ring = [0] + primary
+        for c in range(1, len(self.capacity)):
+            self.L[c] = self.R[c] = c
+        for k, c in enumerate(ring):
+            self.R[c] = ring[(k + 1) % len(ring)]
+            self.L[c] = ring[k - 1]
+        self.remaining = list(self.capacity)
+        self.needed = list(self.table_counts)
+        self.taken_from_hand = 0
+        self.sets_taken = []
+        self.selected = []
+        self.nodes = 0
+
+    ## Cover and uncover
+
+    def hide_row(self, node:int):
+        """
+        Unlinks the row of node from all the columns but the one of node.
+        """
+        q = self.R[node]
+        while q != node:
+            self.D[self.U[q]] = self.D[q]
+            self.U[self.D[q]] = self.U[q]
+            self.S[self.C[q]] -= 1
+            q = self.R[q]
+
+    def unhide_row(self, node:int):
+        q = self.L[node]
+        while q != node:
+            self.S[self.C[q]] += 1
+            self.D[self.U[q]] = q
+            self.U[self.D[q]] = q
+            q = self.L[q]
+
+    def cover(self, c:int):
+        """
+        All the copies of the card at column c are taken: unlinks the rows containing it.
+        """
+        p = self.D[c]
+        while p != c:
+            self.hide_row(p)
+            p = self.D[p]
+
+    def uncover(self, c:int):
+        p = self.U[c]
+        while p != c:
+            self.unhide_row(p)
+            p = self.U[p]
+
+    def select(self, node:int):
+        """
+        Takes the row of node: for each card in it, one more copy is used.
+        """
+        q = node
+        while True:
+            c = self.C[q]
+            self.remaining[c] -= 1
+            if self.needed[c] > 0:
+                self.needed[c] -= 1
+                if self.needed[c] == 0:
+                    self.R[self.L[c]] = self.R[c]
+                    self.L[self.R[c]] = self.L[c]
+            else:
+                self.taken_from_hand += 1
+            if self.remaining[c] == 0:
+                self.cover(c)
+            q = self.R[q]
+            if q == node:
+                break
+        self.sets_taken.append(self.ROW[node])
+        self.selected.append(node)
+
+    def unselect(self, node:int):
+        """
+        Undoes select(node), in reverse order.
+        """
+        self.sets_taken.pop()
+        self.selected.pop()
+        q = self.L[node]
+        while True:
+            c = self.C[q]
+            if self.remaining[c] == 0:
+                self.uncover(c)
+            self.remaining[c] += 1
+            if self.capacity[c] - self.remaining[c] < self.table_counts[c]:
+                if self.needed[c] == 0:
+                    self.R[self.L[c]] = c
+                    self.L[self.R[c]] = c
+                self.needed[c] += 1
+            else:
+                self.taken_from_hand -= 1
+            if q == node:
+                break
+            q = self.L[q]
+
+    ## Search
+
+    def choose_column(self)->int:
+        """
+        Primary column with the least number of rows.
+        """
+        c = self.R[0]
+        min_, min_col = self.S[c], c
+        while c != 0:
+            if self.S[c] < min_:
+                min_, min_col = self.S[c], c
+                if min_ == 0:
+                    break
+            c = self.R[c]
+        return min_col
+
+    def first_row_from_hand(self)->int:
+        """
+        Called when all the primary columns are satisfied: returns a node of the first row still linked (all its
+        tiles are in the hand), or -1 if there is none.
+        """
+        best = -1
+        for c in range(1, len(self.capacity)):
+            if self.remaining[c] > 0 and self.S[c] > 0:
+                p = self.D[c]
+                if best == -1 or self.ROW[p] < self.ROW[best]:
+                    best = p
+        return best
+
+    def state_key(self)->bytes:
+        """
+        Key of the current position in the transposition table.
+        """
+        hand_remaining = [r - t for r, t in zip(self.remaining[1:], self.needed[1:])]
+        return transposition.encode_state(self.slots, self.needed[1:], hand_remaining, self.taken_from_hand > 0)
+
+    def search(self)->bool:
+        """
+        If should_stop is a function, it is called every stop_check_interval nodes and at the node stop_at_node,
+        and if it returns True the search raises array_solver.SearchInterrupted.
+        """
+        self.nodes += 1
+        if self.should_stop is not None and (self.nodes % self.stop_check_interval == 0
+                                             or self.nodes == self.stop_at_node) and self.should_stop():
+            raise array_solver.SearchInterrupted()
+        if self.R[0] == 0:
+            if self.taken_from_hand:
+                return True
+            node = self.first_row_from_hand()
+            if node == -1:
+                return False
+            self.select(node)
+            return True
+
+        c = self.choose_column()
+        if self.S[c] == 0:
+            return False
+
+        key = None
+        if self.transposition_table is not None:
+            key = self.state_key()
+            if self.transposition_table.is_failure(key):
+                return False
+
+        p = self.D[c]
+        while p != c:
+            self.select(p)
+            if self.search():
+                return True
+            self.unselect(p)
+            p = self.D[p]
+
+        if key is not None:
+            self.transposition_table.add_failure(key)
+        return False
+
+    def solve(self, transposition_table=None)->(bool, list):
+        """
+        transposition_table is None or a transposition_table.TranspositionTable, possibly shared with other solves.
+        """
+        self.transposition_table = transposition_table
+        if transposition_table is not None and self.slots is None:
+            self.slots = transposition.card_slots(self.columns)
+        self.reset()
+        if self.missing_table_card:
+            return False, []
+        try:
+            found = self.search()
+            winning_set = [list(self.row_sets[row]) for row in self.sets_taken]
+        finally:
+            # the search stops with the winning sets (or the sets taken when interrupted) still selected: unselect
+            # them to restore the links
+            while self.selected:
+                self.unselect(self.selected[-1])
+        if found:
+            return True, winning_set
+        return False, []
+
+
+# Main function
+
+def solver(current_matrix:pd.DataFrame, cards_on_table:dict, transposition_table=None)->(bool, list):
+    """
+    current_matrix and cards_on_table as in solver.solver (current_matrix can also be a find_matrix.SparseMatrix).
+    Returns True, winning set if you can play,
+    False, [] otherwise.
+
+    Unlike solver.solver, if the cards on the table can be arranged without tiles from the hand, the winning set
+    also contains the set of tiles from the hand that you play.
+    """
+    return DancingLinks.from_dataframe(current_matrix, cards_on_table).solve(transposition_table)
@@ -3,6 +3,9 @@ Main function: from_cards_to_matrix. Takes a string of cards ['2r','4b',...] and
 The jokers are distinct, so that each set does not contain multiple cards. row[i] corresponds to the valid set (a, b, c) iff matrix[i,a], matrix[i,b], matrix[i,c] != 0. If matrix[i,c] != 0, the number
 matrix[i,c] is the multiplicity that card c appears (on table + hand).
 
+With use_catalog=True, from_cards_to_matrix does not generate the valid sets: it filters the precomputed catalog of
+all the admissible sets in set_catalog.
+
 Other functions: same_color_valid_sets and same_number_valid_sets.
 Example for same_color_valid_sets:
 ({'r': ['13r', '3r', '4r', '2r', '1r'], 'b': ['4b', '3b']}, 0) --> 
@@ -12,8 +15,10 @@ Example for same_color_valid_sets:
 import numpy as np
 import itertools
 import pandas as pd
+from collections import namedtuple
 
 from modules import find_admissible_sets as admissible_sets
+# set_catalog imports this module (for SparseMatrix), it is imported only with use_catalog=True
 
 ###########
 ## Auxiliary functions
@@ -163,58 +168,91 @@ def same_number_valid_sets(same_numb_dic, numb_jokers=0):
 ## Get matrix
 ###########
 
-def add_valid_tuples_from_dic(starting_matrix, new_dic, card_multiplicities, sorted_cards, numb_total_cards):
+# Sparse matrix in CSR format: the cards of row i are columns[indices[indptr[i]:indptr[i+1]]], and data has the
+# corresponding multiplicities.
+SparseMatrix = namedtuple('SparseMatrix', ['indptr', 'indices', 'data', 'columns'])
+
+
+def add_valid_tuples_from_dic(indptr, indices, new_dic, card_columns, skip_single_card_sets=False):
     """
-    Auxiliary, used in get_matrix
+    Auxiliary, used in get_matrix. Appends to indices the columns of the cards of each valid set in new_dic, and
+    to indptr where each set ends.
+    If skip_single_card_sets, the sets with only one card which is not a joker (like ('5r', 'jb', 'jr')) are
+    skipped: they are both same-color and same-number sets, so they are added only once.
     """
-    result = []
     for key in new_dic.keys():
         for valid_set in new_dic[key]:
-            new_row = np.zeros(numb_total_cards)
-            for card in valid_set:
-                occurences_card = card_multiplicities[card]
-                new_row[sorted_cards.index(card)] = occurences_card
-            result.append(new_row)
+            if skip_single_card_sets and sum(card[0] != 'j' for card in valid_set) == 1:
+                continue
+            indices.extend(sorted(card_columns[card] for card in valid_set))
+            indptr.append(len(indices))
+
+
+def sparse_to_dense(sparse_matrix:SparseMatrix)->np.ndarray:
+    """
+    Returns the dense np.array of a SparseMatrix.
+    """
+    numb_rows = len(sparse_matrix.indptr) - 1
+    result = np.zeros((numb_rows, len(sparse_matrix.columns)))
+    rows = np.repeat(np.arange(numb_rows), np.diff(sparse_matrix.indptr))
+    result[rows, sparse_matrix.indices] = sparse_matrix.data
     return result
-                
-                
 
-def get_matrix(card_multiplicities, number_valid_sets, color_valid_sets, return_pd_dataframe=False):
+
+def get_matrix(card_multiplicities, number_valid_sets, color_valid_sets, return_pd_dataframe=False,
+               return_sparse=False):
     """
     Input: return_pd_dataframe is a dic with keys cards and values their multiplicities.
     number_valid_sets and color_valid_sets are dict with values valid sets of cards
     return_pd_dataframe is a bool
+    return_sparse is a bool
     
     Returns: if return_pd_dataframe a pd.dataframe with columns the cards I have and indices the
     valid combinations of cards. The value at column '2r' and index a particular (valid) combination is
     0 if 2r does not appear in that combination and euqal to card_multiplicities['2r'] otherwise.
     For example, if the index corresponds to (3r, 4r, 5r) then the value on column 2r is 0, but on columns 3r,
     4r, 5r are all greater than 0    
+    If return_sparse (and not return_pd_dataframe), the same matrix as a SparseMatrix. Otherwise the same
+    matrix as a np.array.
+    
+    Each valid set appears once: the matrix is built only from the nonzero entries, the dense matrix or the
+    pd.dataframe are created from them only if asked.
     """
     sorted_cards = sorted(list(card_multiplicities.keys()))
-    l = len(sorted_cards)
+    card_columns = {card: j for j, card in enumerate(sorted_cards)}
     
-    result = add_valid_tuples_from_dic([], number_valid_sets, card_multiplicities, sorted_cards, l)
-    result = result+add_valid_tuples_from_dic(result, color_valid_sets, card_multiplicities, sorted_cards, l)
+    indptr, indices = [0], []
+    add_valid_tuples_from_dic(indptr, indices, number_valid_sets, card_columns)
+    add_valid_tuples_from_dic(indptr, indices, color_valid_sets, card_columns, skip_single_card_sets=True)
+    
+    indices = np.array(indices, dtype=np.int32)
+    multiplicities = np.array([card_multiplicities[card] for card in sorted_cards], dtype=float)
+    sparse_matrix = SparseMatrix(np.array(indptr, dtype=np.int64), indices, multiplicities[indices], sorted_cards)
     
     if return_pd_dataframe:
-        return pd.DataFrame(result, columns=sorted_cards).drop_duplicates()
-    else:
-        return np.array(result)
+        return pd.DataFrame(sparse_to_dense(sparse_matrix), columns=sorted_cards)
+    if return_sparse:
+        return sparse_matrix
+    return sparse_to_dense(sparse_matrix)
 
 # Main function
 
-def from_cards_to_matrix(cards, print_intermediate_results=False, return_pd_dataframe=True):
+def from_cards_to_matrix(cards, print_intermediate_results=False, return_pd_dataframe=True, use_catalog=False,
+                         return_sparse=False):
     """
     Input: cards is a list strings, which are the cards I have.
     print_intermediate_results is a bool, = true for debug
     return_pd_dataframe is a bool
+    use_catalog is a bool. If True the valid sets are read from set_catalog (built the first time if needed), the
+    rows are the same but possibly in a different order
+    return_sparse is a bool, used only if not return_pd_dataframe
     
     Returns: if return_pd_dataframe a pd.dataframe with columns the cards I have and indices the
     valid combinations of cards. The value at column '2r' and index a particular (valid) combination is
     0 if 2r does not appear in that combination and euqal to card_multiplicities['2r'] otherwise.
     For example, if the index corresponds to (3r, 4r, 5r) then the value on column 2r is 0, but on columns 3r,
     4r, 5r are all greater than 0    
+    If return_sparse and not return_pd_dataframe, returns the matrix as a SparseMatrix, otherwise as a np.array.
     """
     dic_mult = create_dic_multiplicities(cards)
     card_mult = dic_mult.copy()
@@ -238,6 +276,11 @@ def from_cards_to_matrix(cards, print_intermediate_results=False, return_pd_data
     if print_intermediate_results:
         print('number of jokers:',numb_jokers)
         print('cards with jokers:', card_mult)
+    
+    if use_catalog:
+        from modules import set_catalog
+        return set_catalog.matrix_from_catalog(card_mult, return_pd_dataframe=return_pd_dataframe,
+                                               return_sparse=return_sparse)
 
     same_number = same_number_dict(dic_mult)
     if print_intermediate_results:
@@ -255,4 +298,5 @@ def from_cards_to_matrix(cards, print_intermediate_results=False, return_pd_data
     if print_intermediate_results:
         print('same_number_set', same_number_set)
     
-    return get_matrix(card_mult, same_number_set, same_color_set, return_pd_dataframe=return_pd_dataframe)
+    return get_matrix(card_mult, same_number_set, same_color_set, return_pd_dataframe=return_pd_dataframe,
+                      return_sparse=return_sparse)
@@ -0,0 +1,221 @@
+"""
+Main class: GameSession. Keeps the tiles on the table and in the hand between turns, and the valid sets which can
+be formed with them, so that after a few tiles change we do not call find_matrix.from_cards_to_matrix again.
+
+The valid sets only depend on which tiles are present (table + hand) and on the number of jokers. They are the
+rows of an array_solver.ArraySearch kept by the session, whose columns are set_catalog.CATALOG_CARDS, and the rows
+of each color (the runs of that color) and of each number (the groups of that number) are remembered. When a tile
+is added or removed:
+- if it was (or is now) the only copy, the runs of its color and the groups of its number are replaced by the ones
+generated again,
+- if another copy is present, only the multiplicity of its column changes,
+- if it is a joker, all the sets are generated again.
+Moving tiles between the hand and the table (apply_move) only changes the copies on the table of the columns.
+
+solve searches on these rows: you can play exactly when solver.solver says so, but the rows are in another order
+than in find_matrix.from_cards_to_matrix, so the winning set can be a different one.
+"""
+
+import numpy as np
+
+from modules import array_solver
+from modules import find_matrix
+from modules import set_catalog
+
+LOCATIONS = ['table', 'hand']
+
+
+def tile_name(card:str)->str:
+    """
+    card with the jokers ('jb', 'jr' as in the winning sets of the solver) as 'j'. Raises ValueError if card is
+    not a tile.
+    """
+    if card != 'j' and card not in set_catalog.CARD_INDEX:
+        raise ValueError('Unknown tile ' + str(card))
+    return 'j' if card[0] == 'j' else card
+
+
+def set_key(valid_set:list)->tuple:
+    """
+    The tiles of valid_set which are not jokers, sorted, and the number of jokers.
+    """
+    return tuple(sorted(card for card in valid_set if card[0] != 'j')), sum(card[0] == 'j' for card in valid_set)
+
+
+class GameSession:
+    """
+    cards_on_table, cards_on_hand are lists of strings like ['3b', '4b', 'j'] (jokers as 'j', 'jb' or 'jr', all kept
+    as 'j').
+    """
+    def __init__(self, cards_on_table=[], cards_on_hand=[]):
+        self.tiles = {'table': {}, 'hand': {}}
+        for card in cards_on_table:
+            self.add_to_count('table', card)
+        for card in cards_on_hand:
+            self.add_to_count('hand', card)
+        self.search = array_solver.ArraySearch(set_catalog.CATALOG_CARDS, [],
+                                               np.zeros(len(set_catalog.CATALOG_CARDS), dtype=np.int64), {})
+        # the rows of the search of each key, see generate_rows
+        self.row_ids = {}
+        self.rebuild()
+
+    ## Counts
+
+    def add_to_count(self, where:str, card:str, copies=1):
+        card = tile_name(card)
+        counts = self.tiles[where]
+        counts[card] = counts.get(card, 0) + copies
+        if counts[card] == 0:
+            counts.pop(card)
+
+    def count(self, card:str)->int:
+        """
+        Copies of card on the table and in the hand.
+        """
+        return self.tiles['table'].get(card, 0) + self.tiles['hand'].get(card, 0)
+
+    def numb_jokers(self)->int:
+        return self.count('j')
+
+    def cards_on_table(self)->list:
+        return [card for card, copies in self.tiles['table'].items() for _ in range(copies)]
+
+    def cards_on_hand(self)->list:
+        return [card for card, copies in self.tiles['hand'].items() for _ in range(copies)]
+
+    ## Valid sets
+
+    def present_cards(self, key:tuple)->list:
+        """
+        key is ('color', color) or ('number', number). Returns the cards present of that color (number).
+        """
+        kind, value = key
+        present = set(self.tiles['table']) | set(self.tiles['hand'])
+        present.discard('j')
+        if kind == 'color':
+            return sorted(card for card in present if card[-1] == value)
+        return sorted(card for card in present if card[:-1] == value)
+
+    def generate_rows(self, key:tuple):
+        """
+        Generates again the valid sets of key (the runs of a color or the groups of a number), and replaces the
+        rows of key in the search with them.
+        """
+        kind, value = key
+        cards = self.present_cards(key)
+        valid_sets = []
+        if cards:
+            if kind == 'color':
+                valid_sets = find_matrix.same_color_valid_sets({value: cards}, self.jokers_in_rows)[value]
+                # sets with one card and jokers are also groups, they are kept only there (as in find_matrix)
+                valid_sets = [valid_set for valid_set in valid_sets
+                              if sum(card[0] != 'j' for card in valid_set) > 1]
+            else:
+                valid_sets = find_matrix.same_number_valid_sets({value: cards}, self.jokers_in_rows)[value]
+        self.search.remove_rows(self.row_ids.get(key, []))
+        self.row_ids[key] = self.search.add_rows(sorted(sorted(set_catalog.CARD_INDEX[card] for card in valid_set)
+                                                        for valid_set in valid_sets))
+
+    def update_columns(self, card:str):
+        """
+        Sets the multiplicity and the copies on the table of the column of card (of 'jb', 'jr' for 'j') in the
+        search.
+        """
+        if card == 'j':
+            on_table = self.tiles['table'].get('j', 0)
+            for i, joker in enumerate(['jb', 'jr']):
+                self.search.set_multiplicity(set_catalog.CARD_INDEX[joker], int(i < self.jokers_in_rows))
+                self.search.set_table_count(set_catalog.CARD_INDEX[joker], int(i < on_table))
+        else:
+            self.search.set_multiplicity(set_catalog.CARD_INDEX[card], self.count(card))
+            self.search.set_table_count(set_catalog.CARD_INDEX[card], self.tiles['table'].get(card, 0))
+
+    def rebuild(self):
+        """
+        Generates all the valid sets again.
+        """
+        self.jokers_in_rows = min(self.numb_jokers(), 2)
+        for number in set_catalog.NUMBERS:
+            self.generate_rows(('number', number))
+        for color in set_catalog.COLORS:
+            self.generate_rows(('color', color))
+        for card in set_catalog.CATALOG_CARDS[:-2]:
+            self.update_columns(card)
+        self.update_columns('j')
+
+    def tile_changed(self, card:str, old_count:int):
+        """
+        Updates the valid sets and the columns of the search after the copies of card (table + hand) went from
+        old_count to count(card).
+        """
+        new_count = self.count(card)
+        if card == 'j':
+            if min(new_count, 2) != self.jokers_in_rows:
+                self.rebuild()
+                return
+        elif (old_count == 0) != (new_count == 0):
+            self.generate_rows(('color', card[-1]))
+            self.generate_rows(('number', card[:-1]))
+        self.update_columns(card)
+
+    ## Changes between turns
+
+    def add_tile(self, card:str, where='hand'):
+        """
+        Adds a copy of card to where, one of LOCATIONS.
+        """
+        if where not in LOCATIONS:
+            raise ValueError('where must be one of ' + str(LOCATIONS) + ', got ' + str(where))
+        card = tile_name(card)
+        old_count = self.count(card)
+        self.add_to_count(where, card)
+        self.tile_changed(card, old_count)
+
+    def remove_tile(self, card:str, where='hand'):
+        """
+        Removes a copy of card from where, one of LOCATIONS.
+        """
+        if where not in LOCATIONS:
+            raise ValueError('where must be one of ' + str(LOCATIONS) + ', got ' + str(where))
+        card = tile_name(card)
+        if self.tiles[where].get(card, 0) == 0:
+            raise ValueError('There is no ' + str(card) + ' on the ' + where)
+        old_count = self.count(card)
+        self.add_to_count(where, card, -1)
+        self.tile_changed(card, old_count)
+
+    def apply_move(self, sets_played:list):
+        """
+        Input: sets_played is the new table, a list of valid sets (jokers as 'j' or 'jb', 'jr') as the winning set
+        of solve. All the tiles of the table must be in it, the other tiles come from the hand. Raises ValueError
+        if one of them is not a valid set of the tiles of the session, or if it leaves a tile of the table out.
+        The tiles present do not change, so neither do the valid sets.
+        """
+        valid_keys = {set_key(self.search.row_sets[row]) for row in array_solver.iterate_bits(self.search.all_rows)}
+        new_table = {}
+        for valid_set in sets_played:
+            if set_key(valid_set) not in valid_keys:
+                raise ValueError(str(valid_set) + ' is not a valid set of the tiles present')
+            for card in valid_set:
+                card = tile_name(card)
+                new_table[card] = new_table.get(card, 0) + 1
+        for card, copies in self.tiles['table'].items():
+            if new_table.get(card, 0) < copies:
+                raise ValueError('The move leaves ' + str(card) + ' out of the table')
+        for card, copies in new_table.items():
+            if copies > self.count(card):
+                raise ValueError('The move uses ' + str(copies) + ' copies of ' + str(card))
+        changed = set(self.tiles['table']) | set(new_table)
+        self.tiles = {'table': new_table,
+                      'hand': {card: self.count(card) - new_table.get(card, 0) for card in set(self.tiles['hand'])
+                               if self.count(card) > new_table.get(card, 0)}}
+        for card in changed:
+            self.update_columns(card)
+
+    ## Solve
+
+    def solve(self)->(bool, list):
+        """
+        Returns True, winning set if you can play, False, [] otherwise (see the module docstring).
+        """
+        return self.search.solve()
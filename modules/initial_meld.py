@@ -0,0 +1,129 @@
+"""
+Main function: initial_meld. Before your first play (the initial meld) you can only put on the table new sets made
+of tiles of your hand, worth at least MIN_POINTS points in total, and you cannot use the tiles on the table.
+
+The valid sets made of tiles of the hand are those of find_matrix.from_cards_to_matrix(cards_on_hand) (which uses
+find_admissible_sets). The value of a set is the sum of its numbers, a joker is worth the number it replaces:
+- in a group, the number of the group,
+- in a run, the missing number it fills, and the jokers left go at the top of the run if there is room (the
+highest value), otherwise at the bottom.
+A set with one tile and two jokers can be both, and is worth the highest of the two.
+
+The search takes sets (most valuable first, each set any number of times as long as there are tiles) with branch
+and bound: the value of the sets taken plus the value of the tiles left which belong to some set is an upper bound
+of what can still be reached, and if it is not more than the best meld found (or than MIN_POINTS - 1) we skip the
+node.
+"""
+
+from modules import array_solver
+from modules import find_matrix
+
+MIN_POINTS = 30
+
+
+def set_value(valid_set)->int:
+    """
+    Value of a valid set (jokers as 'jb', 'jr') in the initial meld.
+    Example: ['10b', '10r', 'jb'] --> 30, ['11r', '12r', 'jb'] --> 36, ['13r', 'jb', 'jr'] --> 39
+    """
+    numbers = [int(card[:-1]) for card in valid_set if card[0] != 'j']
+    colors = set(card[-1] for card in valid_set if card[0] != 'j')
+    length = len(valid_set)
+    values = []
+    if len(set(numbers)) == 1:
+        values.append(numbers[0]*length)
+    if len(colors) == 1 and len(set(numbers)) == len(numbers):
+        extra_jokers = length - (max(numbers) - min(numbers) + 1)
+        end = min(13, max(numbers) + extra_jokers)
+        values.append(sum(range(end - length + 1, end + 1)))
+    return max(values)
+
+
+class MeldSearch:
+    """
+    Branch and bound over the valid sets of the hand. columns, row_cols, multiplicities as in
+    array_solver.matrix_to_arrays.
+    """
+    def __init__(self, columns:list, row_cols:list, multiplicities:list):
+        self.columns = columns
+        values = [set_value([columns[j] for j in cols]) for cols in row_cols]
+        order = sorted(range(len(row_cols)), key=lambda row: -values[row])
+        self.row_cols = [list(row_cols[row]) for row in order]
+        self.row_values = [values[row] for row in order]
+        self.multiplicities = [int(m) for m in multiplicities]
+
+        # the most a tile can be worth in a set: its number, for a joker the most it is worth in a set
+        self.tile_values = [0]*len(columns)
+        for cols, value in zip(self.row_cols, self.row_values):
+            for j in cols:
+                if columns[j][0] == 'j':
+                    self.tile_values[j] = max(self.tile_values[j], value - sum(int(columns[k][:-1]) for k in cols
+                                                                             if columns[k][0] != 'j'))
+                else:
+                    self.tile_values[j] = int(columns[j][:-1])
+        self.nodes = 0
+
+    def explore(self, first_row:int, value:int, value_left:int):
+        self.nodes += 1
+        if value > self.best_value:
+            self.best_value = value
+            self.best_rows = list(self.taken)
+            if self.stop_at_first:
+                return True
+        if value + value_left <= self.best_value:
+            return False
+
+        for row in range(first_row, len(self.row_cols)):
+            cols = self.row_cols[row]
+            if any(self.capacity[j] == 0 for j in cols):
+                continue
+            if value + self.row_values[row] + value_left <= self.best_value:
+                continue
+            freed = 0
+            for j in cols:
+                self.capacity[j] -= 1
+                freed += self.tile_values[j]
+            self.taken.append(row)
+            # the same set can be taken again, if there are the tiles
+            finished = self.explore(row, value + self.row_values[row], value_left - freed)
+            self.taken.pop()
+            for j in cols:
+                self.capacity[j] += 1
+            if finished:
+                return True
+        return False
+
+    def run(self, min_points=MIN_POINTS, stop_at_first=False)->(bool, list, int):
+        """
+        Returns (found, sets, points): found is True if there is a meld worth at least min_points, sets the most
+        valuable meld (the first one found worth at least min_points if stop_at_first), points its value.
+        """
+        self.capacity = list(self.multiplicities)
+        self.taken = []
+        self.best_value = min_points - 1
+        self.best_rows = None
+        self.stop_at_first = stop_at_first
+        self.nodes = 0
+        in_some_set = set(j for cols in self.row_cols for j in cols)
+        value_left = sum(self.tile_values[j]*self.capacity[j] for j in in_some_set)
+        self.explore(0, 0, value_left)
+        if self.best_rows is None:
+            return False, [], 0
+        return True, [[self.columns[j] for j in self.row_cols[row]] for row in self.best_rows], self.best_value
+
+# Main function
+
+def initial_meld(cards_on_hand:list, min_points=MIN_POINTS, stop_at_first=False)->(bool, list, int):
+    """
+    Input: cards_on_hand is a list of strings like ['10b', '11b', 'j'] (jokers as 'j'). min_points is the value the
+    meld has to reach. If stop_at_first, returns the first meld found worth at least min_points instead of the
+    most valuable one.
+
+    Returns: (found, sets, points). If found, sets is a list of valid sets (jokers as 'jb', 'jr') made of tiles of
+    the hand worth points >= min_points in total. Otherwise False, [], 0.
+    """
+    if len(cards_on_hand) == 0:
+        return False, [], 0
+    matrix = find_matrix.from_cards_to_matrix(cards_on_hand, return_pd_dataframe=False, return_sparse=True)
+    columns, row_cols, multiplicities = array_solver.matrix_to_arrays(matrix)
+    return MeldSearch(columns, row_cols, multiplicities).run(min_points, stop_at_first)
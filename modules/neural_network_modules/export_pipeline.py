@@ -0,0 +1,108 @@
+"""
+Main function: export_pipeline. Puts the object detection model, the model predicting the number and the model
+predicting the color in one tf.function, and saves it as a single SavedModel:
+
+image --> detection --> boxes with score > score_threshold --> crops resized to 96x96 and 20x20 (one
+crop_and_resize for each size) --> model_number and model_color --> labels and probabilities
+
+The input signature is fixed: an uint8 image (height, width, 3) and the score threshold (a float). With
+jit_compile=True the classification of the crops is compiled with XLA (the detection is not: the number of boxes
+kept depends on the scores).
+
+get_info_photo.get_cards_in_photo_with_pipeline uses the exported model.
+
+Run python -m modules.neural_network_modules.export_pipeline to export it in PIPELINE_LOCATION (use --jit_compile
+for XLA).
+
+Needs tensorflow.
+"""
+
+import argparse
+
+import tensorflow as tf
+
+from modules.neural_network_modules import get_info_photo as get_cards
+from modules.neural_network_modules import model_number_and_color as my_models
+from modules.neural_network_modules.model_locations import (DETECTION_LOCATION, NUMBER_LOCATION, COLOR_LOCATION,
+                                                            PIPELINE_LOCATION)
+
+
+class FusedPipeline(tf.Module):
+    """
+    detect_fn, model_number, model_color as in get_info_photo.get_cards_in_photo.
+    """
+    def __init__(self, detect_fn, model_number, model_color, jit_compile=False):
+        super(FusedPipeline, self).__init__()
+        self.detect_fn = detect_fn
+        self.model_number = model_number
+        self.model_color = model_color
+        self.number_labels = tf.constant(get_cards.NUMB_CARDS)
+        self.color_labels = tf.constant(get_cards.COL_CARDS)
+        self.classify = tf.function(self.classify_crops, jit_compile=jit_compile)
+
+    def classify_crops(self, number_batch, color_batch):
+        return self.model_number(number_batch), self.model_color(color_batch)
+
+    @tf.function(input_signature=[tf.TensorSpec([None, None, 3], tf.uint8),
+                                  tf.TensorSpec([], tf.float32)])
+    def __call__(self, image, score_threshold):
+        """
+        Returns a dict with, for each tile detected: 'boxes', 'scores', the 96x96 crops ('crops', uint8, to show
+        them if the prediction has to be confirmed), 'number_probabilities', 'color_probabilities', and the most
+        likely 'numbers', 'colors' and 'labels' (number + color).
+        """
+        images = image[tf.newaxis, ...]
+        detections = self.detect_fn(images)
+        keep = detections['detection_scores'][0] > score_threshold
+        boxes = tf.boolean_mask(detections['detection_boxes'][0], keep)
+        scores = tf.boolean_mask(detections['detection_scores'][0], keep)
+
+        number_batch = get_cards.crop_and_resize_cards(images, boxes, get_cards.NUMBER_SHAPE)
+        color_batch = get_cards.crop_and_resize_cards(images, boxes, get_cards.COLOR_SHAPE)
+        number_probabilities, color_probabilities = self.classify(number_batch, color_batch)
+
+        numbers = tf.gather(self.number_labels, tf.argmax(number_probabilities, axis=1))
+        colors = tf.gather(self.color_labels, tf.argmax(color_probabilities, axis=1))
+        return {'boxes': boxes,
+                'scores': scores,
+                'crops': tf.cast(number_batch, tf.uint8),
+                'number_probabilities': number_probabilities,
+                'color_probabilities': color_probabilities,
+                'numbers': numbers,
+                'colors': colors,
+                'labels': tf.strings.join([numbers, colors])}
+
+# Main function
+
+def export_pipeline(export_dir=PIPELINE_LOCATION, detection_location=DETECTION_LOCATION,
+                    number_location=NUMBER_LOCATION, color_location=COLOR_LOCATION, jit_compile=False,
+                    numb_augmentations=len(my_models.AUGMENTATIONS), early_exit_threshold=None):
+    """
+    Loads the three models, composes them in a FusedPipeline and saves it in export_dir.
+    numb_augmentations and early_exit_threshold are those of model_number_and_color.ModelPrediction.
+    Returns the FusedPipeline.
+    """
+    if jit_compile and early_exit_threshold is not None:
+        raise ValueError('The early exit selects the tiles to augment at run time, it cannot be compiled with XLA')
+    detect_fn = tf.saved_model.load(detection_location)
+    model_number = my_models.load_model_number(number_location, numb_augmentations=numb_augmentations,
+                                               early_exit_threshold=early_exit_threshold)
+    model_color = my_models.load_model_color(color_location, numb_augmentations=numb_augmentations,
+                                             early_exit_threshold=early_exit_threshold)
+    pipeline = FusedPipeline(detect_fn, model_number, model_color, jit_compile)
+    tf.saved_model.save(pipeline, export_dir,
+                        signatures={'serving_default': pipeline.__call__.get_concrete_function()})
+    return pipeline
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export detection and classification as one SavedModel.')
+    parser.add_argument('--output', default=PIPELINE_LOCATION)
+    parser.add_argument('--jit_compile', action='store_true', help='compile the classification with XLA')
+    parser.add_argument('--augmentations', type=int, default=len(my_models.AUGMENTATIONS),
+                        help='number of augmented copies of each tile (0: no test time augmentation)')
+    parser.add_argument('--early_exit_threshold', type=float, default=None)
+    args = parser.parse_args()
+    export_pipeline(args.output, jit_compile=args.jit_compile, numb_augmentations=args.augmentations,
+                    early_exit_threshold=args.early_exit_threshold)
+    print('Saved the pipeline in', args.output)
@@ -2,29 +2,44 @@
 Main function: get_cards_in_photo. Using detect_fn detects where the tiles in the image at image_path are. Using
 model_number, model_color, for each tile detected, gets its number and color. 
 
-Needs tensorflow.
+get_cards_in_photo_with_pipeline does the same with the single model exported by export_pipeline.
+
+The object detection model sees the photo resized to detection_size (longest side), and the tiles are cropped (from
+the uint8 image, only the crops are float) from the photo decoded at crop_size (see image_decoding). By default
+(None) both are the full resolution of the photo; with image_decoding.DETECTION_SIZE and image_decoding.CROP_SIZE
+(as in Rummikub_main and the model server) a large JPEG is never decoded at full resolution.
+
+Needs tensorflow, imported by the functions which run the models: get_cards_in_photo reads a photo from the cache
+without importing it.
 """
 
 import numpy as np
-import tensorflow as tf
 
 import os
-import matplotlib.pyplot as plt
 from PIL import Image
 
+from modules.neural_network_modules.labels import NUMB_CARDS, COL_CARDS, label_from_prediction
+from modules.neural_network_modules import image_decoding
 
-NUMB_CARDS = ['1', '10', '11', '12', '13', '2', '3', '4', '5', '6', '7', '8', '9', 'j']
-COL_CARDS = ['b', 'n', 'o', 'r']
+NUMBER_SHAPE = (96, 96)
+COLOR_SHAPE = (20, 20)
 
 #############
 ## Get cards in photo
 ############
 
-def get_image(image, from_path):
-    if from_path:
-        return np.array(Image.open(image))
-    else:
-        return np.array(image)
+def get_image(image, from_path, max_size=None):
+    """
+    The photo as an array. If max_size is not None, it is decoded at a reduced scale (for a JPEG) and resized so
+    that its longest side is at most max_size.
+    """
+    if max_size is None:
+        if from_path:
+            return np.array(Image.open(image))
+        else:
+            return np.array(image)
+    photo = image_decoding.open_image(image, from_path, max_size)
+    return np.array(image_decoding.resize_image(photo, max_size))
 
 def export_batch_of_cards(card_boxes, image_np, image_shape):
     """
@@ -48,6 +63,7 @@ def get_cards_from_photo(image, confidence_threshold, detect_fn, from_path):
     """
     Returns a list of photos of cards in the image
     """
+    import tensorflow as tf
     image_np = get_image(image, from_path)
     input_tensor = tf.convert_to_tensor(image_np)
     input_tensor = input_tensor[tf.newaxis, ...]
@@ -60,46 +76,94 @@ def get_cards_from_photo(image, confidence_threshold, detect_fn, from_path):
     return all_cards
 
 
+def crop_and_resize_cards(images, card_boxes, new_shape):
+    """
+    images is a batch with the image, card_boxes the boxes detected by the obj detection model (ymin, xmin, ymax,
+    xmax, relative to the size of the image).
+    
+    Returns the batch (float32) of the crops of the image along card_boxes resized to new_shape, with one op over
+    all the boxes. crop_and_resize reads the uint8 image directly: only the crops are float.
+    """
+    import tensorflow as tf
+    box_indices = tf.zeros(tf.shape(card_boxes)[0], dtype=tf.int32)
+    return tf.image.crop_and_resize(images, card_boxes, box_indices, new_shape)
+
+
+def detect_cards(image_np, confidence_threshold, detect_fn):
+    """
+    Returns the batch with the image and the boxes (as a tensor) of the cards detected in it with a score above
+    confidence_threshold.
+    """
+    import tensorflow as tf
+    input_tensor = tf.convert_to_tensor(image_np)
+    input_tensor = input_tensor[tf.newaxis, ...]
+
+    new_detections = detect_fn(input_tensor)
+
+    card_boxes = tf.boolean_mask(new_detections['detection_boxes'][0],
+                                 new_detections['detection_scores'][0] > confidence_threshold)
+    return input_tensor, card_boxes
+
+
+def detect_and_crop(photo, confidence_threshold, detect_fn, detection_size=None):
+    """
+    photo is a PIL image (see image_decoding.open_image). Detects the cards in photo resized to detection_size, and
+    crops them from photo.
+    Returns the boxes of the cards and their batches resized to NUMBER_SHAPE and to COLOR_SHAPE.
+    """
+    import tensorflow as tf
+    image_np = np.asarray(photo)
+    detection_photo = image_decoding.resize_image(photo, detection_size)
+    if detection_photo is photo:
+        input_tensor, card_boxes = detect_cards(image_np, confidence_threshold, detect_fn)
+        return (card_boxes,
+                crop_and_resize_cards(input_tensor, card_boxes, NUMBER_SHAPE),
+                crop_and_resize_cards(input_tensor, card_boxes, COLOR_SHAPE))
+    # the boxes are relative to the size of the image, so they are the same on photo
+    _, card_boxes = detect_cards(np.asarray(detection_photo), confidence_threshold, detect_fn)
+    input_tensor = tf.convert_to_tensor(image_np)[tf.newaxis, ...]
+    return (card_boxes,
+            crop_and_resize_cards(input_tensor, card_boxes, NUMBER_SHAPE),
+            crop_and_resize_cards(input_tensor, card_boxes, COLOR_SHAPE))
+
+
+def get_card_batches_from_photo(image, confidence_threshold, detect_fn, from_path, detection_size=None,
+                                crop_size=None):
+    """
+    Returns the batches of the cards in the image, resized to NUMBER_SHAPE and to COLOR_SHAPE, ready for
+    model_number and model_color.
+    """
+    photo = image_decoding.open_image(image, from_path, crop_size)
+    _, number_batch, color_batch = detect_and_crop(photo, confidence_threshold, detect_fn, detection_size)
+    return number_batch, color_batch
+
+
+def predict_batch(batch, model):
+    """
+    Runs model once on the batch of cards (already resized). model can be a keras model or a
+    tflite_backend.TFLiteModel.
+    Returns a np.array (number of cards, number of classes) with the probabilities.
+    """
+    return np.asarray(model(batch))
+
+
 def get_info_card(image, model, detect_number=False, confidence_threshold=None, accept_input=True):
     """
     Gets number and color from a card. 
     """
+    import tensorflow as tf
     if detect_number:
-        new_shape = (96, 96)
-    else:
-        new_shape = (20, 20)
-    image_r = tf.image.resize(image, new_shape)
-    prediction = model(image_r[np.newaxis, ...]).numpy()[0]
-    
-    if confidence_threshold is not None:
-        if np.max(prediction) < confidence_threshold and accept_input:
-            if detect_number:
-                print('The model predicts ', NUMB_CARDS[np.argmax(prediction)], ' with confidence ', np.max(prediction),'. As it is below the set threshold, we need to confirm it.')
-            else:
-                print('The model predicts ', COL_CARDS[np.argmax(prediction)], ' with confidence ', np.max(prediction),'. As it is below the set threshold, we need to confirm it.')
-                
-            plt.imshow(image)
-            plt.show()
-            if detect_number:
-                val = input('Which number is it? If this is not a card write 123. ')
-            else:
-                val = input('Which color is it? The colors are b, n, o, r. If this is not a card write 123. ')
-            return val
-    
-        if detect_number:
-            return NUMB_CARDS[np.argmax(prediction)]
-        else:
-            return COL_CARDS[np.argmax(prediction)]
-    
-    if detect_number:
-        return NUMB_CARDS[np.argmax(prediction)]
+        new_shape = NUMBER_SHAPE
     else:
-        return COL_CARDS[np.argmax(prediction)]
+        new_shape = COLOR_SHAPE
+    prediction = predict_batch(tf.image.resize(image, new_shape)[np.newaxis, ...], model)[0]
+    return label_from_prediction(image, prediction, detect_number, confidence_threshold, accept_input)
 
 
 def get_cards_in_photo(image, detect_fn, model_number, model_color,
                        conf_threshold_color=.6, conf_threshold_number=.6,
-                       conf_treshold_bounding_box=.985, accept_input=True, from_path=True):
+                       conf_treshold_bounding_box=.985, accept_input=True, from_path=True,
+                       detection_size=None, crop_size=None, cache=None, backend='keras'):
     """
     Returns a list with entries str(card number) + str(card color) for every card detected by
     the object detection function detect_fn.
@@ -108,12 +172,77 @@ def get_cards_in_photo(image, detect_fn, model_number, model_color,
     enter which card is detected.
     conf_treshold_bounding_box is used to keep all the bounding boxes which have probability>=conf_treshold_bounding_box
     to be a card
+    
+    The cards are cropped and resized with crop_and_resize_cards, then they go through model_number in one batch,
+    and through model_color in another one: the thresholds (and the questions) are applied afterwards.
+    detection_size, crop_size are the resolutions of the detection and of the crops (see image_decoding), None for
+    the full resolution of the photo.
+    If cache is a result_cache.ResultCache, a photo already analysed with the same arguments (and the same backend,
+    see tflite_backend, of the models) is read from it, otherwise the result is saved in it.
+    """
+    if cache is not None:
+        key = cache.key(image, from_path, conf_threshold_color=conf_threshold_color,
+                        conf_threshold_number=conf_threshold_number,
+                        conf_treshold_bounding_box=conf_treshold_bounding_box, accept_input=accept_input,
+                        detection_size=detection_size, crop_size=crop_size, backend=backend)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached['labels']
+    photo = image_decoding.open_image(image, from_path, crop_size)
+    card_boxes, number_batch, color_batch = detect_and_crop(photo, conf_treshold_bounding_box, detect_fn,
+                                                            detection_size)
+    result = []
+    numbers = np.zeros((0, len(NUMB_CARDS)), dtype=np.float32)
+    colors = np.zeros((0, len(COL_CARDS)), dtype=np.float32)
+    if number_batch.shape[0] > 0:
+        numbers = predict_batch(number_batch, model_number)
+        colors = predict_batch(color_batch, model_color)
+    for card, number_prediction, color_prediction in zip(number_batch, numbers, colors):
+        number = label_from_prediction(card, number_prediction, True,
+                                       confidence_threshold=conf_threshold_number, accept_input=accept_input)
+        color = label_from_prediction(card, color_prediction, confidence_threshold=conf_threshold_color,
+                                      accept_input=accept_input)
+        result.append(number+color)
+    if cache is not None:
+        cache.put(key, {'boxes': np.asarray(card_boxes, dtype=np.float32).reshape(-1, 4),
+                        'number_probabilities': numbers,
+                        'color_probabilities': colors,
+                        'labels': result})
+    return result
+
+
+def get_cards_in_photo_with_pipeline(image, pipeline, conf_threshold_color=.6, conf_threshold_number=.6,
+                                     conf_treshold_bounding_box=.985, accept_input=True, from_path=True,
+                                     detection_size=None, cache=None):
+    """
+    Same as get_cards_in_photo, with pipeline the model saved by export_pipeline.export_pipeline (loaded with
+    tf.saved_model.load): detection, crops and classification are a single call, on the photo resized to
+    detection_size. cache as in get_cards_in_photo (the results have the backend 'fused').
     """
-    all_cards = get_cards_from_photo(image, conf_treshold_bounding_box, detect_fn, from_path)
+    import tensorflow as tf
+    if cache is not None:
+        # the pipeline crops the tiles from the image of the detection, so there is no crop_size
+        key = cache.key(image, from_path, conf_threshold_color=conf_threshold_color,
+                        conf_threshold_number=conf_threshold_number,
+                        conf_treshold_bounding_box=conf_treshold_bounding_box, accept_input=accept_input,
+                        detection_size=detection_size, crop_size=None, backend='fused')
+        cached = cache.get(key)
+        if cached is not None:
+            return cached['labels']
+    image_np = get_image(image, from_path, detection_size)
+    outputs = pipeline(tf.convert_to_tensor(image_np, dtype=tf.uint8), tf.constant(conf_treshold_bounding_box))
+    numbers = outputs['number_probabilities'].numpy()
+    colors = outputs['color_probabilities'].numpy()
     result = []
-    for card in all_cards:
-        number = get_info_card(card, model_number,  True,
-                               confidence_threshold=conf_threshold_number, accept_input=accept_input)
-        color = get_info_card(card, model_color, confidence_threshold=conf_threshold_color, accept_input=accept_input)
+    for card, number_prediction, color_prediction in zip(outputs['crops'].numpy(), numbers, colors):
+        number = label_from_prediction(card, number_prediction, True,
+                                       confidence_threshold=conf_threshold_number, accept_input=accept_input)
+        color = label_from_prediction(card, color_prediction, confidence_threshold=conf_threshold_color,
+                                      accept_input=accept_input)
         result.append(number+color)
+    if cache is not None:
+        cache.put(key, {'boxes': outputs['boxes'].numpy().reshape(-1, 4),
+                        'number_probabilities': numbers,
+                        'color_probabilities': colors,
+                        'labels': result})
     return result
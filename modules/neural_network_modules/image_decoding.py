@@ -0,0 +1,55 @@
+"""
+Decoding of the photos at the resolution needed, instead of the full resolution of the camera.
+
+- open_image: the photo as a PIL image. A JPEG is decoded with DCT scaling (PIL's draft) at the smallest scale
+(1, 1/2, 1/4 or 1/8) where its longest side is still at least min_size: for a 12MP photo (4032x3024) and
+min_size=1280, it decodes 2016x1512 pixels instead of 4032x3024.
+- resize_image: the photo resized so that its longest side is at most max_size. This is the image seen by the
+object detection model, which was trained on photos of 1280x960 (DETECTION_SIZE).
+
+The detected boxes are relative to the size of the image, so the tiles can be cropped from a photo of another
+resolution along the same boxes.
+
+Does not need tensorflow.
+"""
+
+import numpy as np
+from PIL import Image
+
+# longest side of the image given to the object detection model
+DETECTION_SIZE = 1280
+# the tiles are cropped from the photo decoded at the smallest JPEG scale with longest side at least CROP_SIZE
+CROP_SIZE = 1280
+
+
+def scaled_size(size, max_size)->tuple:
+    """
+    size (width, height) scaled so that the longest side is max_size (size if it is already smaller).
+    """
+    width, height = size
+    scale = min(1., max_size/max(width, height))
+    return max(1, round(width*scale)), max(1, round(height*scale))
+
+
+def open_image(image, from_path=True, min_size=None)->Image.Image:
+    """
+    Returns the photo at image (a path if from_path, otherwise an array or a PIL image) as a PIL image. If
+    min_size is not None a JPEG is decoded at a reduced scale, with longest side at least min_size.
+    """
+    if not from_path:
+        return image if isinstance(image, Image.Image) else Image.fromarray(np.asarray(image))
+    photo = Image.open(image)
+    if min_size is not None:
+        # draft only changes the scale of a JPEG which was not decoded yet, and does nothing on other formats
+        photo.draft(photo.mode, scaled_size(photo.size, min_size))
+    return photo
+
+
+def resize_image(photo:Image.Image, max_size=None)->Image.Image:
+    """
+    photo resized (bilinear) so that its longest side is at most max_size. None keeps photo.
+    """
+    if max_size is None or max(photo.size) <= max_size:
+        return photo
+    return photo.resize(scaled_size(photo.size, max_size), Image.BILINEAR)
+
@@ -0,0 +1,54 @@
+"""
+Labels of the models predicting the number and the color, and label_from_prediction, which chooses the label of a
+tile from the probabilities predicted (asking for it if the model is not confident enough). fix_jokers turns the
+labels into the tiles used by the solver.
+
+Does not need tensorflow, so that model_client can use it. matplotlib is imported only to show a tile.
+"""
+
+import numpy as np
+
+NUMB_CARDS = ['1', '10', '11', '12', '13', '2', '3', '4', '5', '6', '7', '8', '9', 'j']
+COL_CARDS = ['b', 'n', 'o', 'r']
+
+
+def label_from_prediction(image, prediction, detect_number=False, confidence_threshold=None, accept_input=True):
+    """
+    Returns the number (or color if not detect_number) with the highest probability in prediction. If this
+    probability is below confidence_threshold and accept_input, shows the image of the card and asks for it.
+    """
+    if detect_number:
+        labels = NUMB_CARDS
+    else:
+        labels = COL_CARDS
+    
+    if confidence_threshold is not None:
+        if np.max(prediction) < confidence_threshold and accept_input:
+            import matplotlib.pyplot as plt
+            
+            print('The model predicts ', labels[np.argmax(prediction)], ' with confidence ', np.max(prediction),'. As it is below the set threshold, we need to confirm it.')
+                
+            plt.imshow(np.asarray(image).astype(np.uint8))
+            plt.show()
+            if detect_number:
+                val = input('Which number is it? If this is not a card write 123. ')
+            else:
+                val = input('Which color is it? The colors are b, n, o, r. If this is not a card write 123. ')
+            return val
+    
+    return labels[np.argmax(prediction)]
+
+
+def fix_jokers(list_of_cards):
+    """
+    Drops the labels which are not tiles (like '123', entered for something which is not a tile), and writes the
+    jokers as 'j'.
+    """
+    result = []
+    for card in list_of_cards:
+        if card[0] != 'j':
+            if len(card)<4:
+                result.append(card)
+        else:
+            result.append('j')
+    return result
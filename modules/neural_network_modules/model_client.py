@@ -0,0 +1,209 @@
+"""
+Main function: get_cards_in_photo. Same as get_info_photo.get_cards_in_photo, but the neural networks run in the
+model server (model_server.py), which keeps them loaded: this module does not import tensorflow.
+
+The client and the server talk over a Unix socket (DEFAULT_SOCKET) or a port of localhost. Each message is a JSON
+dict, preceded by its length (4 bytes, big endian). Arrays are sent as base64 of their bytes, with their shape and
+dtype. The requests are:
+- {'type': 'ping'} --> {'ok': True, 'backend', 'detection_size', 'crop_size'} (the backend of the models, see
+tflite_backend, and the resolutions, see image_decoding),
+- {'type': 'photo', 'array': ...}, with 'conf_treshold_bounding_box' --> {'boxes', 'number_probabilities',
+'color_probabilities'} of the tiles detected. The server never opens a file: the client decodes the photo, at the
+crop_size of the server,
+- {'type': 'tiles', 'tiles': [...]} --> {'number_probabilities', 'color_probabilities'} of the tiles (images
+of single tiles),
+- {'type': 'shutdown'}.
+An error in the server gives {'error': message}.
+"""
+
+import base64
+import json
+import socket
+import struct
+
+import numpy as np
+from PIL import Image
+
+from modules.neural_network_modules import image_decoding
+from modules.neural_network_modules.labels import label_from_prediction
+
+DEFAULT_SOCKET = '/tmp/rummikub_model_server.sock'
+DISPLAY_SHAPE = (96, 96)
+
+###########
+## Protocol
+###########
+
+def encode_array(array)->dict:
+    array = np.ascontiguousarray(array)
+    return {'shape': list(array.shape), 'dtype': str(array.dtype), 'data': base64.b64encode(array.tobytes()).decode()}
+
+
+def decode_array(message:dict)->np.ndarray:
+    return np.frombuffer(base64.b64decode(message['data']), dtype=message['dtype']).reshape(message['shape'])
+
+
+def receive_exactly(connection, numb_bytes:int)->bytes:
+    chunks = []
+    while numb_bytes > 0:
+        chunk = connection.recv(numb_bytes)
+        if not chunk:
+            raise ConnectionError('Connection closed')
+        chunks.append(chunk)
+        numb_bytes -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(connection, message:dict):
+    data = json.dumps(message).encode()
+    connection.sendall(struct.pack('>I', len(data)) + data)
+
+
+def receive_message(connection)->dict:
+    length, = struct.unpack('>I', receive_exactly(connection, 4))
+    return json.loads(receive_exactly(connection, length))
+
+###########
+## Client
+###########
+
+class ModelClient:
+    """
+    Connection to a model server. address is the path of a Unix socket, or (host, port).
+    """
+    def __init__(self, address=DEFAULT_SOCKET, timeout=None):
+        self.address = address
+        self.timeout = timeout
+        self.connection = None
+        # the answer of the last ping, see settings
+        self.ping_answer = None
+
+    def connect(self):
+        if self.connection is None:
+            if isinstance(self.address, str):
+                self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            else:
+                self.connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.connection.settimeout(self.timeout)
+            try:
+                self.connection.connect(self.address)
+            except OSError:
+                self.close()
+                raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def request(self, message:dict)->dict:
+        """
+        Sends message and returns the answer of the server. Raises RuntimeError if the server had an error.
+        """
+        self.connect()
+        try:
+            send_message(self.connection, message)
+            answer = receive_message(self.connection)
+        except OSError:
+            self.close()
+            raise
+        if 'error' in answer:
+            raise RuntimeError('Model server error: ' + answer['error'])
+        return answer
+
+    def ping(self)->bool:
+        """
+        True if the server answers.
+        """
+        try:
+            self.ping_answer = self.request({'type': 'ping'})
+        except OSError:
+            return False
+        return self.ping_answer.get('ok', False)
+
+    def settings(self)->dict:
+        """
+        The 'backend', 'detection_size' and 'crop_size' of the server, from the answer of the last ping (the server
+        is pinged only if it was not before).
+        """
+        if self.ping_answer is None:
+            self.ping_answer = self.request({'type': 'ping'})
+        answer = self.ping_answer
+        return {'backend': answer.get('backend', 'keras'), 'detection_size': answer.get('detection_size'),
+                'crop_size': answer.get('crop_size')}
+
+    def classify_photo(self, image, conf_treshold_bounding_box=.985, from_path=True)->dict:
+        """
+        image is the path of a photo if from_path (decoded here at the crop_size of the server, see settings),
+        otherwise an array. Returns a dict with the 'boxes', 'number_probabilities' and 'color_probabilities'
+        (np.arrays) of the tiles detected.
+        """
+        if from_path:
+            image = image_decoding.open_image(image, True, self.settings()['crop_size'])
+        message = {'type': 'photo', 'conf_treshold_bounding_box': conf_treshold_bounding_box,
+                   'array': encode_array(np.asarray(image, dtype=np.uint8))}
+        answer = self.request(message)
+        return {key: decode_array(value) for key, value in answer.items()}
+
+    def classify_tiles(self, tiles:list)->dict:
+        """
+        tiles is a list of images of single tiles (of any size). Returns a dict with the 'number_probabilities' and
+        'color_probabilities' (np.arrays) of the tiles.
+        """
+        answer = self.request({'type': 'tiles',
+                               'tiles': [encode_array(np.asarray(tile, dtype=np.uint8)) for tile in tiles]})
+        return {key: decode_array(value) for key, value in answer.items()}
+
+    def shutdown(self):
+        self.request({'type': 'shutdown'})
+        self.close()
+
+
+def crop_box(image:Image.Image, box)->np.ndarray:
+    """
+    Crop of image along box (ymin, xmin, ymax, xmax relative to the size of the image), resized to DISPLAY_SHAPE.
+    """
+    width, height = image.size
+    ymin, xmin, ymax, xmax = box
+    crop = image.crop((int(xmin*width), int(ymin*height), int(xmax*width), int(ymax*height)))
+    return np.array(crop.resize(DISPLAY_SHAPE))
+
+# Main function
+
+def get_cards_in_photo(image, client=None, conf_threshold_color=.6, conf_threshold_number=.6,
+                       conf_treshold_bounding_box=.985, accept_input=True, from_path=True, cache=None):
+    """
+    Same as get_info_photo.get_cards_in_photo, with the neural networks of the model server of client (a
+    ModelClient, by default connected to DEFAULT_SOCKET). cache is a result_cache.ResultCache or None, as there: the
+    key has the backend and the resolutions of the server (client.settings()).
+    """
+    if client is None:
+        client = ModelClient()
+    if cache is not None:
+        key = cache.key(image, from_path, conf_threshold_color=conf_threshold_color,
+                        conf_threshold_number=conf_threshold_number,
+                        conf_treshold_bounding_box=conf_treshold_bounding_box, accept_input=accept_input,
+                        **client.settings())
+        cached = cache.get(key)
+        if cached is not None:
+            return cached['labels']
+    outputs = client.classify_photo(image, conf_treshold_bounding_box, from_path)
+    photo = None
+    result = []
+    for box, number_prediction, color_prediction in zip(outputs['boxes'], outputs['number_probabilities'],
+                                                        outputs['color_probabilities']):
+        card = None
+        if accept_input and (np.max(number_prediction) < conf_threshold_number
+                             or np.max(color_prediction) < conf_threshold_color):
+            # the crop is needed only to ask for the tile
+            if photo is None:
+                photo = Image.open(image).convert('RGB') if from_path else Image.fromarray(np.asarray(image))
+            card = crop_box(photo, box)
+        number = label_from_prediction(card, number_prediction, True,
+                                       confidence_threshold=conf_threshold_number, accept_input=accept_input)
+        color = label_from_prediction(card, color_prediction, confidence_threshold=conf_threshold_color,
+                                      accept_input=accept_input)
+        result.append(number+color)
+    if cache is not None:
+        cache.put(key, dict(outputs, labels=result))
+    return result
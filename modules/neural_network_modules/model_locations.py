@@ -0,0 +1,34 @@
+"""
+Locations of the models and of the sample photos, relative to the root of the repo (REPO_ROOT) in the _PATH
+constants, and absolute in the _LOCATION ones, so that they are found whatever the working directory.
+
+Does not need tensorflow.
+"""
+
+import os
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DETECTION_PATH = 'models/saved_model_obj_det'
+NUMBER_PATH = 'models/weights_model_predict_number/accuracy1.0'
+COLOR_PATH = 'models/weights_model_predict_color'
+TFLITE_PATH = 'models/tflite'
+PIPELINE_PATH = 'models/fused_pipeline'
+RESULT_CACHE_PATH = 'models/result_cache'
+SAMPLE_PHOTOS_PATH = 'sample_photos'
+
+
+def location(path)->str:
+    """
+    path (relative to REPO_ROOT, with '/') as an absolute path.
+    """
+    return os.path.join(REPO_ROOT, *path.split('/'))
+
+
+DETECTION_LOCATION = location(DETECTION_PATH)
+NUMBER_LOCATION = location(NUMBER_PATH)
+COLOR_LOCATION = location(COLOR_PATH)
+TFLITE_LOCATION = location(TFLITE_PATH)
+PIPELINE_LOCATION = location(PIPELINE_PATH)
+RESULT_CACHE_LOCATION = location(RESULT_CACHE_PATH)
+SAMPLE_PHOTOS = location(SAMPLE_PHOTOS_PATH)
@@ -25,19 +25,48 @@ class DataAug(tf.keras.Model):
 
 data_aug = DataAug()
 
+# (number of rotations by 90 degrees, brightness) of the copies of a tile used by ModelPrediction, the first
+# numb_augmentations are used
+AUGMENTATIONS = [(angle, b) for b in [.1, .2] for angle in [0, 1, 2, 3]]
+
 class ModelPrediction(tf.keras.Model):
-    def __init__(self, base_model):
+    """
+    Test time augmentation: the prediction of a tile is the mean of the predictions of base_model on
+    numb_augmentations (at most len(AUGMENTATIONS)) rotated and brightened copies of it. With numb_augmentations=0
+    it is the prediction of base_model.
+    If early_exit_threshold is not None, base_model first predicts the tiles as they are, and only the tiles whose
+    highest probability is below early_exit_threshold are augmented.
+    """
+    def __init__(self, base_model, numb_augmentations=len(AUGMENTATIONS), early_exit_threshold=None):
         super(ModelPrediction, self).__init__()
+        if not 0 <= numb_augmentations <= len(AUGMENTATIONS):
+            raise ValueError('numb_augmentations must be between 0 and ' + str(len(AUGMENTATIONS)))
         self.base_model = base_model 
         self.bright = tf.image.adjust_brightness
         self.rotate = tf.image.rot90
+        self.augmentations = AUGMENTATIONS[:numb_augmentations]
+        self.early_exit_threshold = early_exit_threshold
     
-    def call(self, photo):
-        angles_r = [0, 1, 2, 3]
-        br = [.1,.2]
-        batch = tf.stack([self.bright(self.rotate(photo[0], angle), b) for angle in angles_r for b in br])
+    def augmented_prediction(self, photo):
+        """
+        photo is a batch of N tiles. The K copies of each tile are built on the whole batch, the K*N images go
+        through base_model at once, and the N predictions are the mean of those of the K copies of each tile.
+        """
+        batch = tf.concat([self.bright(self.rotate(photo, angle), b) for angle, b in self.augmentations], axis=0)
         all_results = self.base_model(batch)
-        return tf.expand_dims(tf.math.reduce_mean(all_results, axis=0), axis=0)
+        all_results = tf.reshape(all_results, (len(self.augmentations), -1, all_results.shape[-1]))
+        return tf.math.reduce_mean(all_results, axis=0)
+    
+    def call(self, photo):
+        if len(self.augmentations) == 0:
+            return self.base_model(photo)
+        if self.early_exit_threshold is None:
+            return self.augmented_prediction(photo)
+        
+        plain = self.base_model(photo)
+        uncertain = tf.where(tf.math.reduce_max(plain, axis=1) < self.early_exit_threshold)
+        augmented = self.augmented_prediction(tf.gather_nd(photo, uncertain))
+        return tf.tensor_scatter_nd_update(plain, uncertain, tf.cast(augmented, plain.dtype))
 
 class MyModel_color(tf.keras.Model):
     def __init__(self):
@@ -75,30 +104,39 @@ class MyModel_number(tf.keras.Model):
             x = layer(x)
         return x
 
-def load_model_number(loc, use_augmented_input=True):
-    _ = tf.keras.models.load_model(loc)
-    pred_model_number = _.layers[0]
+def load_model_number(loc, use_augmented_input=True, numb_augmentations=len(AUGMENTATIONS),
+                      early_exit_threshold=None):
+    """
+    Loads the model predicting the number from loc. If use_augmented_input, it is wrapped in ModelPrediction with
+    numb_augmentations and early_exit_threshold.
+    """
+    saved_model = tf.keras.models.load_model(loc)
+    pred_model_number = saved_model.layers[0]
     pred_model_number.trainable = False
 
     model_number = MyModel_number(pred_model_number)
     model_number(np.zeros((3,96, 96, 3)), data_aug=False)
 
-    _ = tf.keras.models.load_model(loc)
-    model_number.set_weights(_.get_weights())
+    model_number.set_weights(saved_model.get_weights())
     if use_augmented_input:
-        model_number_aug = ModelPrediction(model_number)
+        model_number_aug = ModelPrediction(model_number, numb_augmentations, early_exit_threshold)
         model_number_aug(np.zeros((3,96, 96, 3)))
         return model_number_aug
     return model_number
 
-def load_model_color(loc, use_augmented_input=True):
+def load_model_color(loc, use_augmented_input=True, numb_augmentations=len(AUGMENTATIONS),
+                     early_exit_threshold=None):
+    """
+    Loads the model predicting the color from loc. If use_augmented_input, it is wrapped in ModelPrediction with
+    numb_augmentations and early_exit_threshold.
+    """
     model_color = MyModel_color()
     model_color(np.zeros((3, 20, 20, 3)), data_aug=False)
 
     _ = tf.keras.models.load_model(loc)
     model_color.set_weights(_.get_weights())
     if use_augmented_input:
-        model_color_aug = ModelPrediction(model_color)
+        model_color_aug = ModelPrediction(model_color, numb_augmentations, early_exit_threshold)
         model_color_aug(np.zeros((3, 20, 20, 3)))
         return model_color_aug
     return model_color
@@ -0,0 +1,182 @@
+"""
+Main function: serve. A server which loads the neural networks once, warms them up, and then classifies the tiles
+of the photos (or the single tiles) sent by model_client, so that a photo does not pay the import of tensorflow and
+the loading of the models. See model_client for the protocol.
+
+Run python -m modules.neural_network_modules.model_server (--socket path, or --port port for localhost, and
+--backend one of tflite_backend.BACKENDS).
+
+Needs tensorflow.
+"""
+
+import argparse
+import os
+import socketserver
+import stat
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+from modules.neural_network_modules import get_info_photo as get_cards
+from modules.neural_network_modules import image_decoding
+from modules.neural_network_modules import model_client
+from modules.neural_network_modules import tflite_backend
+
+WARM_UP_SHAPE = (640, 640, 3)
+
+
+class ModelServer:
+    """
+    The models of backend (see tflite_backend.load_models) and the answers to the requests.
+    """
+    def __init__(self, backend='keras', numb_augmentations=None, early_exit_threshold=None,
+                 detection_size=image_decoding.DETECTION_SIZE, crop_size=image_decoding.CROP_SIZE):
+        self.backend = backend
+        self.detection_size = detection_size
+        self.crop_size = crop_size
+        if numb_augmentations is None:
+            self.models = tflite_backend.load_models(backend, early_exit_threshold=early_exit_threshold)
+        else:
+            self.models = tflite_backend.load_models(backend, numb_augmentations=numb_augmentations,
+                                                     early_exit_threshold=early_exit_threshold)
+        # the models are not called from several threads at once
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+
+    def warm_up(self):
+        self.classify_photo(image_decoding.open_image(np.zeros(WARM_UP_SHAPE, dtype=np.uint8), False), 0.)
+        self.classify_tiles([np.zeros(WARM_UP_SHAPE, dtype=np.uint8)])
+
+    def classify_photo(self, photo, conf_treshold_bounding_box)->dict:
+        """
+        photo is a PIL image (see image_decoding.open_image).
+        """
+        detect_fn, model_number, model_color = self.models
+        with self.lock:
+            card_boxes, number_batch, color_batch = get_cards.detect_and_crop(photo, conf_treshold_bounding_box,
+                                                                              detect_fn, self.detection_size)
+            if number_batch.shape[0] == 0:
+                numbers = np.zeros((0, len(get_cards.NUMB_CARDS)), dtype=np.float32)
+                colors = np.zeros((0, len(get_cards.COL_CARDS)), dtype=np.float32)
+            else:
+                numbers = get_cards.predict_batch(number_batch, model_number)
+                colors = get_cards.predict_batch(color_batch, model_color)
+        return {'boxes': np.asarray(card_boxes, dtype=np.float32),
+                'number_probabilities': numbers,
+                'color_probabilities': colors}
+
+    def classify_tiles(self, tiles:list)->dict:
+        _, model_number, model_color = self.models
+        number_batch = tf.stack([tf.image.resize(tile, get_cards.NUMBER_SHAPE) for tile in tiles])
+        color_batch = tf.stack([tf.image.resize(tile, get_cards.COLOR_SHAPE) for tile in tiles])
+        with self.lock:
+            return {'number_probabilities': get_cards.predict_batch(number_batch, model_number),
+                    'color_probabilities': get_cards.predict_batch(color_batch, model_color)}
+
+    def answer(self, request:dict)->dict:
+        if request['type'] == 'ping':
+            return {'ok': True, 'backend': self.backend, 'detection_size': self.detection_size,
+                    'crop_size': self.crop_size}
+        if request['type'] == 'shutdown':
+            self.stop.set()
+            return {'ok': True}
+        if request['type'] == 'photo':
+            # only arrays: a path would let any client which can connect read the files of the server
+            photo = image_decoding.open_image(model_client.decode_array(request['array']), False)
+            outputs = self.classify_photo(photo, request.get('conf_treshold_bounding_box', .985))
+        elif request['type'] == 'tiles':
+            outputs = self.classify_tiles([model_client.decode_array(tile) for tile in request['tiles']])
+        else:
+            raise ValueError('Unknown request type ' + str(request['type']))
+        return {key: model_client.encode_array(value) for key, value in outputs.items()}
+
+
+class RequestHandler(socketserver.BaseRequestHandler):
+    """
+    Answers the requests of a connection until the client closes it.
+    """
+    def handle(self):
+        model_server = self.server.model_server
+        while True:
+            try:
+                request = model_client.receive_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            except ValueError as error:
+                # not JSON: the length was read, so the next message can still be read
+                model_client.send_message(self.request, {'error': 'Malformed request: ' + repr(error)})
+                continue
+            try:
+                answer = model_server.answer(request)
+            except Exception as error:
+                answer = {'error': repr(error)}
+            model_client.send_message(self.request, answer)
+            if model_server.stop.is_set():
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def remove_stale_socket(socket_path):
+    """
+    Removes socket_path if it is a socket left by a previous server. Raises FileExistsError if it is another kind of
+    file.
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(socket_path + ' exists and is not a socket')
+    os.remove(socket_path)
+
+# Main function
+
+def serve(socket_path=model_client.DEFAULT_SOCKET, port=None, backend='keras', numb_augmentations=None,
+          early_exit_threshold=None, detection_size=image_decoding.DETECTION_SIZE,
+          crop_size=image_decoding.CROP_SIZE):
+    """
+    Loads and warms up the models of backend, then answers the requests on the Unix socket socket_path (or on
+    localhost:port if port is not None) until a shutdown request. detection_size, crop_size are the resolutions of
+    the detection and of the crops (see image_decoding).
+    """
+    model_server = ModelServer(backend, numb_augmentations, early_exit_threshold, detection_size, crop_size)
+    model_server.warm_up()
+    if port is not None:
+        server = TCPServer(('127.0.0.1', port), RequestHandler)
+    else:
+        remove_stale_socket(socket_path)
+        server = UnixServer(socket_path, RequestHandler)
+    server.model_server = model_server
+    print('Models loaded, listening on', socket_path if port is None else 'localhost:' + str(port))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if port is None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Server keeping the neural networks loaded.')
+    parser.add_argument('--socket', default=model_client.DEFAULT_SOCKET, help='path of the Unix socket')
+    parser.add_argument('--port', type=int, default=None, help='listen on localhost:port instead of a Unix socket')
+    parser.add_argument('--backend', default='keras', choices=tflite_backend.BACKENDS)
+    parser.add_argument('--augmentations', type=int, default=None,
+                        help='number of augmented copies of each tile (keras backend)')
+    parser.add_argument('--early_exit_threshold', type=float, default=None)
+    parser.add_argument('--detection_size', type=int, default=image_decoding.DETECTION_SIZE,
+                        help='longest side of the image seen by the object detection model')
+    parser.add_argument('--crop_size', type=int, default=image_decoding.CROP_SIZE,
+                        help='minimum longest side of the photo the tiles are cropped from')
+    args = parser.parse_args()
+    serve(args.socket, args.port, args.backend, args.augmentations, args.early_exit_threshold, args.detection_size,
+          args.crop_size)
@@ -0,0 +1,191 @@
+"""
+Main class: ResultCache. Saves on disk what the neural networks found in a photo (the boxes, the probabilities of
+the number and of the color of each tile, and the labels returned, including those entered by hand), so that
+analysing the same photo again does not run them (nor import tensorflow).
+
+The key of a photo (photo_key) is the sha256 of the bytes of the file (or of the array), of the version of the
+models and of the settings which change the result (thresholds, resolutions, backend, accept_input). The version
+of the models of a backend (model_version) is a hash of the paths (relative to the root of the repo), sizes and
+modification times of the files of that backend only (MODEL_LOCATIONS), so that training, converting or exporting
+its models again invalidates its results, and moving the repo or converting another backend does not.
+
+Each result is a .npz file in the folder of the cache. When the folder is larger than max_bytes the results used
+least recently are deleted (a hit updates the modification time of its file). hits, misses and hit_rate count the
+lookups of this ResultCache.
+
+Does not need tensorflow.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from modules.neural_network_modules import model_locations
+from modules.neural_network_modules.model_locations import REPO_ROOT, DETECTION_PATH, TFLITE_PATH
+
+CACHE_LOCATION = model_locations.RESULT_CACHE_LOCATION
+MAX_BYTES = 50*2**20
+# for each backend, the files (or folders) of its models, relative to REPO_ROOT. The TFLite backends detect the
+# tiles with the keras model (see tflite_backend).
+MODEL_LOCATIONS = {'keras': [DETECTION_PATH, model_locations.NUMBER_PATH, model_locations.COLOR_PATH],
+                   'float16': [DETECTION_PATH, TFLITE_PATH + '/number_float16.tflite',
+                               TFLITE_PATH + '/color_float16.tflite', TFLITE_PATH + '/conversion.json'],
+                   'int8': [DETECTION_PATH, TFLITE_PATH + '/number_int8.tflite', TFLITE_PATH + '/color_int8.tflite',
+                            TFLITE_PATH + '/conversion.json'],
+                   'fused': [model_locations.PIPELINE_PATH]}
+FIELDS = ['boxes', 'number_probabilities', 'color_probabilities', 'labels']
+HASH_CHUNK = 2**20
+
+###########
+## Keys
+###########
+
+def file_hash(path)->str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def array_hash(array)->str:
+    array = np.ascontiguousarray(array)
+    sha = hashlib.sha256(str((array.shape, str(array.dtype))).encode())
+    sha.update(array.tobytes())
+    return sha.hexdigest()
+
+
+def model_version(backend='keras', root=REPO_ROOT)->str:
+    """
+    Hash of the paths relative to root, sizes and modification times of the files of MODEL_LOCATIONS[backend]
+    (folders or files, the missing ones are skipped). Raises FileNotFoundError if there is no file at all, as the
+    version would not change with the models.
+    """
+    sha = hashlib.sha256()
+    numb_files = 0
+    for location in MODEL_LOCATIONS[backend]:
+        location = os.path.join(root, *location.split('/'))
+        paths = [location] if os.path.isfile(location) else sorted(
+            os.path.join(folder, name) for folder, _, names in os.walk(location) for name in names)
+        for path in paths:
+            info = os.stat(path)
+            sha.update(str((os.path.relpath(path, root).replace(os.sep, '/'), info.st_size,
+                            info.st_mtime_ns)).encode())
+        numb_files += len(paths)
+    if numb_files == 0:
+        raise FileNotFoundError('No model files of the backend ' + backend + ' in ' + root)
+    return sha.hexdigest()
+
+
+def photo_key(image, from_path=True, version='', conf_threshold_color=.6, conf_threshold_number=.6,
+              conf_treshold_bounding_box=.985, accept_input=True, detection_size=None,
+              crop_size=None, backend='keras')->str:
+    """
+    Key of the results of get_cards_in_photo on image (a path if from_path, otherwise an array) with these
+    arguments, and models of version version.
+    """
+    settings = {'version': version, 'conf_threshold_color': conf_threshold_color,
+                'conf_threshold_number': conf_threshold_number,
+                'conf_treshold_bounding_box': conf_treshold_bounding_box, 'accept_input': accept_input,
+                'detection_size': detection_size, 'crop_size': crop_size, 'backend': backend}
+    content = file_hash(image) if from_path else array_hash(image)
+    return hashlib.sha256((content + json.dumps(settings, sort_keys=True)).encode()).hexdigest()
+
+###########
+## Cache
+###########
+
+class ResultCache:
+    """
+    The results in location, at most max_bytes. version is the version of the models used by key for every
+    backend, or None for the model_version of each backend (computed at its first key).
+    """
+    def __init__(self, location=CACHE_LOCATION, max_bytes=MAX_BYTES, version=None):
+        self.location = location
+        self.max_bytes = max_bytes
+        self.version = version
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(location, exist_ok=True)
+
+    def backend_version(self, backend)->str:
+        if self.version is not None:
+            return self.version
+        if backend not in self.versions:
+            self.versions[backend] = model_version(backend)
+        return self.versions[backend]
+
+    def key(self, image, from_path=True, backend='keras', **settings)->str:
+        """
+        photo_key of image with the version of the models of backend. settings are the other arguments of
+        photo_key.
+        """
+        return photo_key(image, from_path, self.backend_version(backend), backend=backend, **settings)
+
+    def path(self, key)->str:
+        return os.path.join(self.location, key + '.npz')
+
+    def __contains__(self, key)->bool:
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        """
+        The dict with the FIELDS saved for key (np.arrays, 'labels' a list), or None.
+        """
+        try:
+            with np.load(self.path(key), allow_pickle=False) as data:
+                result = {field: data[field] for field in FIELDS}
+            os.utime(self.path(key))
+        except (OSError, ValueError, KeyError):
+            # missing, or deleted by another process while reading it
+            self.misses += 1
+            return None
+        self.hits += 1
+        result['labels'] = [str(label) for label in result['labels']]
+        return result
+
+    def put(self, key, result:dict):
+        """
+        Saves result, a dict with the FIELDS, for key, then deletes the results used least recently if the cache
+        is larger than max_bytes.
+        """
+        arrays = {field: np.asarray(result[field]) for field in FIELDS}
+        arrays['labels'] = np.asarray(result['labels'], dtype=str)
+        # written to a temporary file and renamed, so that another process never reads half a file
+        descriptor, tmp_path = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.location):
+            if entry.name.endswith('.npz'):
+                info = entry.stat()
+                entries.append((info.st_mtime_ns, info.st_size, entry.path))
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def clear(self):
+        for entry in os.scandir(self.location):
+            if entry.name.endswith('.npz'):
+                os.remove(entry.path)
+
+    def hit_rate(self)->float:
+        lookups = self.hits + self.misses
+        return self.hits/lookups if lookups else 0.
+
+    def stats(self)->dict:
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate()}
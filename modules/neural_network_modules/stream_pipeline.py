@@ -0,0 +1,267 @@
+"""
+Main function: stream_cards. Processes a sequence of photos (the photos of a folder, or the frames of a camera)
+as a pipeline of STAGES, each in its own thread:
+
+decode --> detect (and crop the tiles) --> classify --> solve
+
+The stages are connected by queues of at most queue_size inputs: while the detection model works on a photo, the
+next one is decoded and the previous one is classified or solved, so the throughput is that of the slowest stage
+instead of the sum of the stages. When a queue is full the stage before it waits (the decoding does not run
+ahead of the detection), and the inputs are read from sources only when there is room.
+
+The results are yielded in the order of sources, each as soon as it is solved. Nothing is asked: the labels are
+the most likely ones, and the tiles below the confidence thresholds are listed in 'uncertain'. If cards_on_hand
+is None the solve stage is skipped.
+
+Run python -m modules.neural_network_modules.stream_pipeline folder (--hand 3b,4r for the solve stage) to print the
+result of each photo of folder as a JSON line.
+
+Needs tensorflow.
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from modules import find_matrix
+from modules import solver
+from modules.neural_network_modules import get_info_photo as get_cards
+from modules.neural_network_modules import image_decoding
+from modules.neural_network_modules.labels import NUMB_CARDS, COL_CARDS, fix_jokers
+
+STAGES = ['decode', 'detect', 'classify', 'solve']
+QUEUE_SIZE = 2
+# seconds between two checks that the pipeline was not stopped, while waiting on a queue
+POLL_INTERVAL = .1
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+###########
+## Queues and threads
+###########
+
+DONE = None
+
+
+def put(stage_queue, item, stop)->bool:
+    """
+    Puts item in stage_queue, waiting while it is full. Returns False if stop was set before.
+    """
+    while not stop.is_set():
+        try:
+            stage_queue.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def get(stage_queue, stop):
+    """
+    The next item of stage_queue, or DONE if stop is set.
+    """
+    while not stop.is_set():
+        try:
+            return stage_queue.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            pass
+    return DONE
+
+
+class SourceError:
+    """
+    Put in the queues instead of DONE when reading sources raised error, which run_pipeline raises again.
+    """
+    def __init__(self, error):
+        self.error = error
+
+
+def read_sources(sources, output_queue, stop):
+    end = DONE
+    try:
+        for index, source in enumerate(sources):
+            if not put(output_queue, {'index': index, 'source': source}, stop):
+                return
+    except Exception as error:
+        end = SourceError(error)
+    finally:
+        # the stages and the consumer always see the end of the sources
+        put(output_queue, end, stop)
+
+
+def run_stage(name, function, input_queue, output_queue, stop, stage_seconds):
+    """
+    Applies function to the items of input_queue (dicts, changed in place) and puts them in output_queue. An error
+    is saved in the item, whose next stages are skipped.
+    """
+    while True:
+        item = get(input_queue, stop)
+        if item is DONE or isinstance(item, SourceError):
+            put(output_queue, item, stop)
+            return
+        if 'error' not in item:
+            started = time.perf_counter()
+            try:
+                function(item)
+            except Exception as error:
+                item['error'] = name + ': ' + repr(error)
+            stage_seconds[name] += time.perf_counter() - started
+        if not put(output_queue, item, stop):
+            return
+
+
+def run_pipeline(sources, stages, queue_size=QUEUE_SIZE, stats=None):
+    """
+    stages is a list of (name, function). Yields the items (dicts with 'index' and 'source') of sources after all
+    the stages. If stats is a dict, it gets the 'inputs', the total 'seconds', the 'inputs_per_second' and the
+    'stage_seconds' spent in each stage. If iterating sources raises an error, it is raised again after the items
+    read before it.
+    """
+    started = time.perf_counter()
+    stop = threading.Event()
+    stage_seconds = {name: 0. for name, _ in stages}
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    threads = [threading.Thread(target=read_sources, args=(sources, queues[0], stop), daemon=True)]
+    for (name, function), input_queue, output_queue in zip(stages, queues[:-1], queues[1:]):
+        threads.append(threading.Thread(target=run_stage,
+                                        args=(name, function, input_queue, output_queue, stop, stage_seconds),
+                                        daemon=True))
+    for thread in threads:
+        thread.start()
+    numb_inputs = 0
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is DONE:
+                break
+            if isinstance(item, SourceError):
+                raise item.error
+            numb_inputs += 1
+            yield item
+    finally:
+        # also when the caller stops iterating: the stages waiting on a queue see stop and return (the thread
+        # reading sources is not joined, as sources may be waiting for the next frame of a camera)
+        stop.set()
+        for thread in threads[1:]:
+            thread.join()
+        if stats is not None:
+            seconds = time.perf_counter() - started
+            stats.update({'inputs': numb_inputs,
+                          'seconds': seconds,
+                          'inputs_per_second': numb_inputs/seconds if seconds > 0 else 0.,
+                          'stage_seconds': stage_seconds})
+
+###########
+## Stages
+###########
+
+class StreamPipeline:
+    """
+    detect_fn, model_number, model_color as in get_info_photo.get_cards_in_photo. The sources are paths of photos
+    if from_path, otherwise arrays (for instance the frames of a video). cards_on_hand is a list like ['3b', 'j'],
+    or None to skip the solve stage.
+    """
+    def __init__(self, detect_fn, model_number, model_color, cards_on_hand=None, from_path=True,
+                 conf_threshold_color=.6, conf_threshold_number=.6, conf_treshold_bounding_box=.985,
+                 detection_size=image_decoding.DETECTION_SIZE, crop_size=image_decoding.CROP_SIZE,
+                 engine='dataframe'):
+        self.detect_fn = detect_fn
+        self.model_number = model_number
+        self.model_color = model_color
+        self.cards_on_hand = None if cards_on_hand is None else fix_jokers(cards_on_hand)
+        self.from_path = from_path
+        self.conf_threshold_color = conf_threshold_color
+        self.conf_threshold_number = conf_threshold_number
+        self.conf_treshold_bounding_box = conf_treshold_bounding_box
+        self.detection_size = detection_size
+        self.crop_size = crop_size
+        self.engine = engine
+
+    def decode(self, item):
+        photo = image_decoding.open_image(item['source'], self.from_path, self.crop_size)
+        # decodes the photo now, in this stage
+        photo.load()
+        item['photo'] = photo
+
+    def detect(self, item):
+        card_boxes, number_batch, color_batch = get_cards.detect_and_crop(item.pop('photo'),
+                                                                          self.conf_treshold_bounding_box,
+                                                                          self.detect_fn, self.detection_size)
+        item['boxes'] = np.asarray(card_boxes).tolist()
+        item['batches'] = number_batch, color_batch
+
+    def classify(self, item):
+        number_batch, color_batch = item.pop('batches')
+        labels, uncertain = [], []
+        if number_batch.shape[0] > 0:
+            numbers = get_cards.predict_batch(number_batch, self.model_number)
+            colors = get_cards.predict_batch(color_batch, self.model_color)
+            for index, (number_prediction, color_prediction) in enumerate(zip(numbers, colors)):
+                labels.append(NUMB_CARDS[np.argmax(number_prediction)] + COL_CARDS[np.argmax(color_prediction)])
+                if (np.max(number_prediction) < self.conf_threshold_number
+                        or np.max(color_prediction) < self.conf_threshold_color):
+                    uncertain.append(index)
+        item['labels'] = labels
+        item['uncertain'] = uncertain
+
+    def solve(self, item):
+        cards_on_table = fix_jokers(item['labels'])
+        matrix = find_matrix.from_cards_to_matrix(cards_on_table + self.cards_on_hand)
+        dic_cards_on_table = find_matrix.create_dic_multiplicities(cards_on_table, diversify_jokers=True)
+        item['can_play'], item['winning_set'] = solver.solver(matrix, dic_cards_on_table, engine=self.engine)
+
+    def stages(self)->list:
+        stages = [('decode', self.decode), ('detect', self.detect), ('classify', self.classify)]
+        if self.cards_on_hand is not None:
+            stages.append(('solve', self.solve))
+        return stages
+
+    def run(self, sources, queue_size=QUEUE_SIZE, stats=None):
+        """
+        Yields, for each source, a dict with 'index', 'source', 'boxes', 'labels', 'uncertain' (indices of the
+        labels below the thresholds) and, with cards_on_hand, 'can_play' and 'winning_set'. If a stage fails the
+        dict has the 'error' instead. stats as in run_pipeline.
+        """
+        for item in run_pipeline(sources, self.stages(), queue_size, stats):
+            item.pop('photo', None)
+            item.pop('batches', None)
+            yield item
+
+
+def photos_in_directory(directory)->list:
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().endswith(PHOTO_EXTENSIONS)]
+
+# Main function
+
+def stream_cards(sources, detect_fn, model_number, model_color, cards_on_hand=None, from_path=True,
+                 queue_size=QUEUE_SIZE, stats=None, **kwargs):
+    """
+    Yields the result of each of sources (paths of photos if from_path, otherwise arrays) as StreamPipeline.run.
+    kwargs are the other arguments of StreamPipeline (thresholds, resolutions, engine).
+    """
+    pipeline = StreamPipeline(detect_fn, model_number, model_color, cards_on_hand, from_path, **kwargs)
+    return pipeline.run(sources, queue_size, stats)
+
+
+if __name__ == '__main__':
+    from modules.neural_network_modules import tflite_backend
+
+    parser = argparse.ArgumentParser(description='Tiles of each photo of a folder, through a pipeline of threads.')
+    parser.add_argument('folder')
+    parser.add_argument('--hand', help='tiles in your hand separated by a comma, to solve each photo')
+    parser.add_argument('--backend', default='keras', choices=tflite_backend.BACKENDS)
+    parser.add_argument('--queue_size', type=int, default=QUEUE_SIZE)
+    args = parser.parse_args()
+
+    detect_fn, model_number, model_color = tflite_backend.load_models(args.backend)
+    cards_on_hand = None if args.hand is None else [card for card in args.hand.split(',') if card]
+    stats = {}
+    for result in stream_cards(photos_in_directory(args.folder), detect_fn, model_number, model_color,
+                               cards_on_hand, queue_size=args.queue_size, stats=stats):
+        print(json.dumps(result))
+    print(json.dumps(stats))
@@ -0,0 +1,294 @@
+"""
+TFLite versions of the classification neural networks, for machines with only a CPU.
+
+Main functions:
+- convert_models: converts the model predicting the number and the model predicting the color to TFLite, with
+float16 weights or with int8 quantization. The int8 quantization is calibrated on the tiles detected in the photos
+in sample_photos.
+- load_models: returns detect_fn, model_number, model_color of a backend in BACKENDS, to pass to
+get_info_photo.get_cards_in_photo. 'keras' are the current models, 'float16' and 'int8' the TFLite classification
+models.
+
+The object detection model is not converted: it is a SavedModel of the object detection API, which
+TFLiteConverter.from_saved_model does not convert (its TFLite version has to be exported with
+export_tflite_graph_tf2.py of the API, and returns the boxes in another format). Every backend detects the tiles
+with the SavedModel, and classifies them one batch per photo, where most of the time of a photo with many tiles
+goes.
+- compare_backends: for each backend, the time per photo and how often the labels agree with those of the
+'keras' backend, both for the whole photo and for the classification of the same tiles.
+
+The TFLite models run with tflite_runtime if it is installed, otherwise with tf.lite. The classification models
+are converted with numb_augmentations test time augmentations (0 by default, see
+model_number_and_color.ModelPrediction), saved in CONVERSION_FILE next to them: compare_backends runs the 'keras'
+reference with the same augmentations, so that the comparison measures the conversion only.
+
+Run python -m modules.neural_network_modules.tflite_backend convert to write the models in TFLITE_LOCATION, and
+python -m modules.neural_network_modules.tflite_backend report for the comparison.
+
+Needs tensorflow.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    Interpreter = tf.lite.Interpreter
+
+from modules.neural_network_modules import get_info_photo as get_cards
+from modules.neural_network_modules import image_decoding
+from modules.neural_network_modules import model_number_and_color as my_models
+from modules.neural_network_modules.model_locations import (DETECTION_LOCATION, NUMBER_LOCATION, COLOR_LOCATION,
+                                                            TFLITE_LOCATION, SAMPLE_PHOTOS)
+
+CONVERSION_FILE = 'conversion.json'
+
+BACKENDS = ['keras', 'float16', 'int8']
+QUANTIZATIONS = ['float16', 'int8']
+MODELS = ['number', 'color']
+CONF_TRESHOLD_BOUNDING_BOX = .985
+# detection_size, crop_size of the photos, as in the model server
+PHOTO_SIZES = (image_decoding.DETECTION_SIZE, image_decoding.CROP_SIZE)
+
+###########
+## Calibration data
+###########
+
+def sample_photo_paths(sample_dir=SAMPLE_PHOTOS)->list:
+    return [os.path.join(sample_dir, name) for name in sorted(os.listdir(sample_dir))
+            if name.lower().endswith(('.jpg', '.jpeg', '.png'))]
+
+
+def calibration_data(detect_fn, sample_dir=SAMPLE_PHOTOS)->dict:
+    """
+    Returns a dict with the tiles detected by detect_fn in the photos in sample_dir, resized for the model
+    predicting the number ('number') and the color ('color').
+    """
+    number_batches, color_batches = [], []
+    for path in sample_photo_paths(sample_dir):
+        number_batch, color_batch = get_cards.get_card_batches_from_photo(path, CONF_TRESHOLD_BOUNDING_BOX,
+                                                                          detect_fn, True, *PHOTO_SIZES)
+        number_batches.append(number_batch.numpy())
+        color_batches.append(color_batch.numpy())
+    return {'number': [tile[np.newaxis, ...] for batch in number_batches for tile in batch],
+            'color': [tile[np.newaxis, ...] for batch in color_batches for tile in batch]}
+
+###########
+## Conversion
+###########
+
+def classifier_saved_model(model, input_shape, directory):
+    """
+    Saves the keras model with a fixed input signature (a float32 batch of any size of images of input_shape), so
+    that it can be converted by tf.lite.TFLiteConverter.from_saved_model.
+    """
+    serve = tf.function(lambda batch: model(batch),
+                        input_signature=[tf.TensorSpec([None] + list(input_shape) + [3], tf.float32)])
+    module = tf.Module()
+    module.model = model
+    module.serve = serve
+    tf.saved_model.save(module, directory, signatures={'serving_default': serve.get_concrete_function()})
+
+
+def convert_saved_model(saved_model_dir, quantization, representative_data=None)->bytes:
+    """
+    Converts the SavedModel in saved_model_dir to TFLite, with quantization in QUANTIZATIONS.
+    For 'int8', representative_data is a list of inputs used to calibrate the quantization. Ops without an int8
+    version stay in float, and the inputs and outputs are float.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError('quantization must be one of ' + str(QUANTIZATIONS) + ', got ' + str(quantization))
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        converter.representative_dataset = lambda: ([sample] for sample in representative_data)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8, tf.lite.OpsSet.TFLITE_BUILTINS]
+    return converter.convert()
+
+
+def tflite_path(output_dir, model, quantization):
+    return os.path.join(output_dir, model + '_' + quantization + '.tflite')
+
+
+def converted_augmentations(tflite_dir=TFLITE_LOCATION)->int:
+    """
+    numb_augmentations of the classification models converted in tflite_dir (0 if CONVERSION_FILE is missing).
+    """
+    path = os.path.join(tflite_dir, CONVERSION_FILE)
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return json.load(f)['numb_augmentations']
+
+
+def convert_models(output_dir=TFLITE_LOCATION, quantizations=QUANTIZATIONS, sample_dir=SAMPLE_PHOTOS,
+                   numb_augmentations=0)->list:
+    """
+    Converts the two classification models with each quantization in quantizations, and writes them in output_dir
+    as model_quantization.tflite (model in MODELS), and numb_augmentations in CONVERSION_FILE. Returns the list of
+    the files written.
+    """
+    detect_fn = tf.saved_model.load(DETECTION_LOCATION)
+    data = calibration_data(detect_fn, sample_dir) if 'int8' in quantizations else {}
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    with tempfile.TemporaryDirectory() as tmp:
+        saved_models = {'number': os.path.join(tmp, 'number'),
+                        'color': os.path.join(tmp, 'color')}
+        classifier_saved_model(my_models.load_model_number(NUMBER_LOCATION, numb_augmentations=numb_augmentations),
+                               get_cards.NUMBER_SHAPE, saved_models['number'])
+        classifier_saved_model(my_models.load_model_color(COLOR_LOCATION, numb_augmentations=numb_augmentations),
+                               get_cards.COLOR_SHAPE, saved_models['color'])
+        for model in MODELS:
+            for quantization in quantizations:
+                tflite_model = convert_saved_model(saved_models[model], quantization, data.get(model))
+                path = tflite_path(output_dir, model, quantization)
+                with open(path, 'wb') as f:
+                    f.write(tflite_model)
+                written.append(path)
+    path = os.path.join(output_dir, CONVERSION_FILE)
+    with open(path, 'w') as f:
+        json.dump({'numb_augmentations': numb_augmentations}, f)
+    written.append(path)
+    return written
+
+###########
+## Runtime
+###########
+
+class TFLiteModel:
+    """
+    Runs the TFLite model at model_path. Called with a batch (of any size) it returns the output of the model
+    as a np.array, as the keras models do: it can be used as model_number or model_color.
+    """
+    def __init__(self, model_path):
+        self.interpreter = Interpreter(model_path=model_path)
+        self.runner = self.interpreter.get_signature_runner()
+        self.input_name = list(self.runner.get_input_details())[0]
+        self.input_dtype = self.runner.get_input_details()[self.input_name]['dtype']
+
+    def run(self, batch)->dict:
+        return self.runner(**{self.input_name: np.asarray(batch, dtype=self.input_dtype)})
+
+    def __call__(self, batch):
+        outputs = self.run(batch)
+        return next(iter(outputs.values()))
+
+
+def load_models(backend='keras', tflite_dir=TFLITE_LOCATION, numb_augmentations=len(my_models.AUGMENTATIONS),
+                early_exit_threshold=None):
+    """
+    Returns detect_fn, model_number, model_color of backend (one of BACKENDS), for
+    get_info_photo.get_cards_in_photo. numb_augmentations and early_exit_threshold are used by the 'keras' backend,
+    the TFLite models have the augmentations they were converted with. detect_fn is the SavedModel for every
+    backend.
+    """
+    if backend not in BACKENDS:
+        raise ValueError('backend must be one of ' + str(BACKENDS) + ', got ' + str(backend))
+    if backend == 'keras':
+        return (tf.saved_model.load(DETECTION_LOCATION),
+                my_models.load_model_number(NUMBER_LOCATION, numb_augmentations=numb_augmentations,
+                                            early_exit_threshold=early_exit_threshold),
+                my_models.load_model_color(COLOR_LOCATION, numb_augmentations=numb_augmentations,
+                                           early_exit_threshold=early_exit_threshold))
+    return (tf.saved_model.load(DETECTION_LOCATION),
+            TFLiteModel(tflite_path(tflite_dir, 'number', backend)),
+            TFLiteModel(tflite_path(tflite_dir, 'color', backend)))
+
+###########
+## Comparison
+###########
+
+def label_agreement(labels, reference_labels)->float:
+    """
+    Fraction of the labels of reference_labels also in labels (counting repetitions).
+    """
+    if len(reference_labels) == 0:
+        return 1.
+    left = list(labels)
+    common = 0
+    for label in reference_labels:
+        if label in left:
+            left.remove(label)
+            common += 1
+    return common/len(reference_labels)
+
+
+def compare_backends(backends=BACKENDS, tflite_dir=TFLITE_LOCATION, sample_dir=SAMPLE_PHOTOS,
+                     numb_augmentations=None)->dict:
+    """
+    The 'keras' backend runs with numb_augmentations test time augmentations (None: those the models in tflite_dir
+    were converted with, see converted_augmentations). Returns a dict with, for each backend:
+    - 'seconds_per_photo': mean time of get_info_photo.get_cards_in_photo on the photos of sample_dir (after a
+    first run to warm up),
+    - 'photo_agreement': mean fraction of the tiles found by the 'keras' backend in a photo which the backend also
+    finds,
+    - 'number_agreement', 'color_agreement': fraction of the tiles detected by the 'keras' backend where the
+    backend predicts the same number (color).
+    """
+    paths = sample_photo_paths(sample_dir)
+    if numb_augmentations is None:
+        numb_augmentations = converted_augmentations(tflite_dir)
+    reference = load_models('keras', numb_augmentations=numb_augmentations)
+    reference_batches = [get_cards.get_card_batches_from_photo(path, CONF_TRESHOLD_BOUNDING_BOX, reference[0], True,
+                                                               *PHOTO_SIZES)
+                         for path in paths]
+    reference_predictions = [(np.argmax(get_cards.predict_batch(numbers, reference[1]), axis=1),
+                              np.argmax(get_cards.predict_batch(colors, reference[2]), axis=1))
+                             for numbers, colors in reference_batches]
+    reference_labels = {}
+    report = {}
+    for backend in ['keras'] + [backend for backend in backends if backend != 'keras']:
+        detect_fn, model_number, model_color = reference if backend == 'keras' else load_models(backend, tflite_dir)
+        get_cards.get_cards_in_photo(paths[0], detect_fn, model_number, model_color, accept_input=False,
+                                     detection_size=PHOTO_SIZES[0], crop_size=PHOTO_SIZES[1])
+
+        start = time.perf_counter()
+        labels = [get_cards.get_cards_in_photo(path, detect_fn, model_number, model_color, accept_input=False,
+                                               detection_size=PHOTO_SIZES[0], crop_size=PHOTO_SIZES[1])
+                  for path in paths]
+        seconds = (time.perf_counter() - start)/len(paths)
+        if backend == 'keras':
+            reference_labels = labels
+
+        same_number, same_color, numb_tiles = 0, 0, 0
+        for (numbers, colors), (reference_numbers, reference_colors) in zip(reference_batches,
+                                                                           reference_predictions):
+            if numbers.shape[0] == 0:
+                continue
+            same_number += np.sum(np.argmax(get_cards.predict_batch(numbers, model_number), axis=1)
+                                  == reference_numbers)
+            same_color += np.sum(np.argmax(get_cards.predict_batch(colors, model_color), axis=1) == reference_colors)
+            numb_tiles += numbers.shape[0]
+        if backend in backends:
+            report[backend] = {'seconds_per_photo': seconds,
+                               'photo_agreement': float(np.mean([label_agreement(photo_labels, keras_labels)
+                                                                 for photo_labels, keras_labels
+                                                                 in zip(labels, reference_labels)])),
+                               'number_agreement': float(same_number/max(numb_tiles, 1)),
+                               'color_agreement': float(same_color/max(numb_tiles, 1))}
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TFLite versions of the neural networks.')
+    parser.add_argument('command', choices=['convert', 'report'])
+    parser.add_argument('--output', default=TFLITE_LOCATION, help='folder of the TFLite models')
+    parser.add_argument('--augmentations', type=int, default=None,
+                        help='test time augmentations of the classification models converted (default 0), or of '
+                             'the keras reference of report (default: those of the converted models)')
+    args = parser.parse_args()
+    if args.command == 'convert':
+        for path in convert_models(args.output, numb_augmentations=args.augmentations or 0):
+            print('Saved', path)
+    else:
+        print(json.dumps(compare_backends(tflite_dir=args.output, numb_augmentations=args.augmentations), indent=2))
@@ -4,6 +4,8 @@ Performs operations with the matrix for the DPS algorithm.
 The functions are:
 - card_appears: checks if some copies of a card appear in a list
 - remaining_cards_on_table: checks if there are cards on the table after removing the sets_taken
+- TileCounter: keeps track of the cards remaining on the table while sets are taken and given back, and gives the
+key of the position in a transposition table
 - choose_card: chooses the next card to look at
 - from_index_to_set: given the matrix and an index, returns the corresponding valid set 
 - sets_with_card: selects all sets where a card appears
@@ -13,6 +15,8 @@ The functions are:
 import numpy as np
 import pandas as pd
 
+from modules import transposition_table as transposition
+
 ## Operations with the matrix
 
 
@@ -55,19 +59,95 @@ def remaining_cards_on_table(sets_taken:list, cards_on_table:dict, return_bool=F
     else:
         return cards_remaining, from_hand
         
+
+class TileCounter:
+    """
+    Counts how many copies of each card on the table are still to be taken, and how many cards were taken from the
+    hand. take and give_back update the counts of the cards in a set, so that checking if the table is empty or
+    if we took cards from the hand does not need to go through all the sets taken.
+    
+    The counts are the same as those of remaining_cards_on_table(sets_taken, cards_on_table).
+    
+    If current_matrix is given, the multiplicity (table + hand) of each of its cards is read from it once, so that
+    state_key can be called at every node without going through the matrix.
+    """
+    def __init__(self, cards_on_table:dict, sets_taken=None, current_matrix=None):
+        self.cards_on_table = cards_on_table
+        self.cards = None
+        if current_matrix is not None:
+            self.cards = list(current_matrix.columns)
+            self.slots = transposition.card_slots(self.cards)
+            self.multiplicities = ([int(multiplicity) for multiplicity in current_matrix.max(axis=0)]
+                                   if current_matrix.shape[0] else [0]*len(self.cards))
+        self.remaining = dict(cards_on_table)
+        self.taken = {}
+        self.table_left = sum(cards_on_table.values())
+        self.taken_from_hand = 0
+        for good_set in sets_taken or []:
+            self.take(good_set)
+    
+    def take(self, valid_set:list):
+        for card in valid_set:
+            self.taken[card] = self.taken.get(card, 0) + 1
+            if self.remaining.get(card, 0) > 0:
+                self.remaining[card] -= 1
+                self.table_left -= 1
+            else:
+                self.taken_from_hand += 1
+    
+    def give_back(self, valid_set:list):
+        """
+        Undoes take(valid_set).
+        """
+        for card in valid_set:
+            self.taken[card] -= 1
+            if self.taken[card] < self.cards_on_table.get(card, 0):
+                self.remaining[card] += 1
+                self.table_left += 1
+            else:
+                self.taken_from_hand -= 1
+    
+    def table_is_empty(self)->bool:
+        return self.table_left == 0
+    
+    def cards_remaining(self)->list:
+        """
+        Cards with copies still on the table, in the order of cards_on_table.
+        """
+        return [card for card in self.cards_on_table if self.remaining[card] > 0]
+    
+    def state_key(self)->bytes:
+        """
+        Returns the key of the current position in a transposition_table.TranspositionTable (the TileCounter must
+        have been created with current_matrix).
+        """
+        table_remaining, hand_remaining = [], []
+        for card, multiplicity in zip(self.cards, self.multiplicities):
+            card_taken = self.taken.get(card, 0)
+            on_table = self.remaining.get(card, 0)
+            table_remaining.append(on_table)
+            hand_remaining.append(multiplicity - card_taken - on_table)
+        return transposition.encode_state(self.slots, table_remaining, hand_remaining, self.taken_from_hand > 0)
+
+
 def choose_card(current_matrix:pd.DataFrame, sets_taken:list,
-                rows_removed:list, columns_removed:list, cards_on_table:dict)->(bool, str):
+                rows_removed:list, columns_removed:list, cards_on_table:dict, tile_counter=None)->(bool, str):
     """
     Chooses the next card to look at. If there is a card which belongs to no sets returns True, card.
     Otherwise returns False, card that belongs to the least number of sets
     
     An input looks like (pd.df, [['2r','3b'],['3n','3o','3r']], [1,2], ['5b','7n'], {'2n':1,'3n':1, '7b':1})
+    If tile_counter (a TileCounter) is given, the cards remaining on the table are read from it instead of being
+    computed from sets_taken.
     """
     new_matrix = current_matrix.drop(rows_removed).drop(columns_removed, axis=1)
     #print(new_matrix)
     multiplicities_cards = (new_matrix>0).sum(axis=0)
     
-    remaining_cards, _ = remaining_cards_on_table(sets_taken, cards_on_table)
+    if tile_counter is not None:
+        remaining_cards = tile_counter.cards_remaining()
+    else:
+        remaining_cards, _ = remaining_cards_on_table(sets_taken, cards_on_table)
     #print('remaining_cards:', remaining_cards)
     
     min_, min_card = 9999999, '200r'
@@ -138,4 +218,5 @@ def get_new_rows_and_cols_removed_or_decreased(current_matrix: pd.DataFrame,
             
     indices_to_drop = list(indices_to_drop)
     del new_matrix
-    return indices_to_drop, dropped_cards, decreased_cards
\ No newline at end of file
+    return indices_to_drop, dropped_cards, decreased_cards
+
@@ -0,0 +1,161 @@
+"""
+Main function: optimize. Instead of stopping at the first way to play, as solver.solver does, finds the way to play
+that puts on the table the most tiles from the hand (objective='tiles') or the most points (objective='points',
+the number of each tile and JOKER_POINTS for a joker, as when counting the tiles left in the hand).
+
+Branch and bound on the search of array_solver.ArraySearch:
+- while there are cards on the table, we branch as solver.solver does, on the sets containing the card on the table
+which belongs to the least number of sets,
+- once the table is empty, the arrangement is a candidate and we go on adding sets made of tiles of the hand. To not
+look at the same sets in different orders, they are added in a fixed order.
+At each node, the value of the tiles of the hand already played plus the value of the tiles of the hand still
+available and belonging to some valid set is an upper bound for the value of all the arrangements below the node:
+if it is not better than the best arrangement found, we skip the node.
+
+If node_limit is reached, the search stops and returns the best arrangement found, together with the gap between
+an upper bound of the value of the arrangements not explored and its value.
+"""
+
+import pandas as pd
+
+from modules import array_solver
+
+OBJECTIVES = ['tiles', 'points']
+JOKER_POINTS = 30
+
+
+def tile_value(card:str, objective:str)->int:
+    """
+    Value of a tile of the hand played. Example: ('12r', 'points') --> 12, ('jb', 'points') --> 30
+    """
+    if objective == 'tiles':
+        return 1
+    if card[0] == 'j':
+        return JOKER_POINTS
+    return int(card[:-1])
+
+
+class _NodeLimitReached(Exception):
+    pass
+
+
+class BranchAndBound:
+    """
+    search is an array_solver.ArraySearch (at its starting position), objective one of OBJECTIVES.
+    """
+    def __init__(self, search:array_solver.ArraySearch, objective='tiles', node_limit=None):
+        if objective not in OBJECTIVES:
+            raise ValueError('objective must be one of ' + str(OBJECTIVES) + ', got ' + str(objective))
+        self.search = search
+        self.objective = objective
+        self.node_limit = node_limit
+        self.values = [tile_value(card, objective) for card in search.columns]
+        # order in which the sets made only of tiles of the hand are added: most valuable first
+        row_values = [sum(self.values[j] for j in cols) for cols in search.row_cols]
+        self.hand_order = sorted(range(len(search.row_cols)), key=lambda row: -row_values[row])
+
+    ## Values and bounds
+
+    def hand_value(self, row:int)->int:
+        """
+        Value of the tiles of the hand used by taking the set at row in the current position.
+        """
+        s = self.search
+        return sum(self.values[j] for j in s.row_cols[row] if s.table_needed[j] == 0)
+
+    def upper_bound(self)->int:
+        """
+        Value played so far plus the value of the tiles of the hand which can still be played.
+        """
+        s = self.search
+        bound = self.value
+        for j, value in enumerate(self.values):
+            hand_left = s.remaining[j] - s.table_needed[j]
+            if hand_left > 0 and s.col_masks[j] & s.live:
+                bound += value*hand_left
+        return bound
+
+    def take(self, row:int)->(int, int):
+        delta = self.hand_value(row)
+        self.value += delta
+        return self.search.take(row), delta
+
+    def undo(self, row:int, old_live:int, delta:int):
+        self.value -= delta
+        self.search.undo(row, old_live)
+
+    def child_bound(self, row:int)->int:
+        old_live, delta = self.take(row)
+        bound = self.upper_bound()
+        self.undo(row, old_live, delta)
+        return bound
+
+    ## Search
+
+    def explore(self, first_hand_position=0):
+        s = self.search
+        s.nodes += 1
+        if self.node_limit is not None and s.nodes > self.node_limit:
+            self.open_bound = max(self.open_bound, self.upper_bound())
+            raise _NodeLimitReached()
+
+        if self.upper_bound() <= self.best_value:
+            return
+
+        if s.table_left == 0:
+            if self.value > self.best_value:
+                self.best_value = self.value
+                self.best_sets = s.winning_set()
+            positions = range(first_hand_position, len(self.hand_order))
+            children = [(self.hand_order[p], p) for p in positions if s.live >> self.hand_order[p] & 1]
+        else:
+            already_lost, next_col = s.choose_card()
+            if already_lost:
+                return
+            children = [(row, 0) for row in s.rows_with_card(next_col)]
+
+        for k, (row, position) in enumerate(children):
+            old_live, delta = self.take(row)
+            try:
+                self.explore(position)
+            except _NodeLimitReached:
+                self.undo(row, old_live, delta)
+                # what is left below row is already in open_bound, the siblings not explored are bounded by
+                # their upper bounds
+                self.open_bound = max([self.open_bound] + [self.child_bound(other) for other, _ in children[k+1:]])
+                raise
+            self.undo(row, old_live, delta)
+
+    def run(self)->(bool, list, int, int):
+        """
+        Returns: (found, best_sets, best_value, gap). found is True if there is a way to play, best_sets the best
+        arrangement found, best_value its value, and gap is 0 if best_value is the optimum, otherwise (node_limit
+        reached) the difference between an upper bound of the optimum and best_value.
+        """
+        s = self.search
+        s.reset()
+        self.value = 0
+        self.best_value = 0
+        self.best_sets = []
+        self.open_bound = 0
+        if not s.missing_table_card:
+            try:
+                self.explore()
+            except _NodeLimitReached:
+                s.reset()
+        gap = max(0, self.open_bound - self.best_value)
+        return self.best_value > 0, self.best_sets, self.best_value, gap
+
+
+# Main function
+
+def optimize(current_matrix:pd.DataFrame, cards_on_table:dict, objective='tiles', node_limit=None):
+    """
+    current_matrix and cards_on_table as in solver.solver (current_matrix can also be a find_matrix.SparseMatrix),
+    objective one of OBJECTIVES, node_limit None or an int.
+
+    Returns: (found, best_sets, best_value, gap) as in BranchAndBound.run. If found, best_sets is the way to play
+    with the most tiles from the hand (or points), and best_value this number.
+    """
+    search = array_solver.ArraySearch.from_dataframe(current_matrix, cards_on_table)
+    return BranchAndBound(search, objective, node_limit).run()
@@ -0,0 +1,281 @@
+"""
+Main function: solver. The search of array_solver on several processes.
+
+The tree of the search is expanded up to split_depth sets taken: every node at that depth (or where the table is
+already empty) is the root of a subtree, and the subtrees are searched by a process pool. Subtrees are numbered in
+the order in which array_solver.solver would search them.
+
+As soon as a worker finds a way to play, the others stop:
+- if deterministic=False, all of them, and the first solution found is returned,
+- if deterministic=True, only those searching subtrees with a higher number. The solution returned is the one of the
+subtree with the lowest number, i.e. the same as array_solver.solver.
+If you cannot play, all the subtrees are searched: with enough subtrees per process this scales with the number of
+processes.
+
+The workers add the nodes they visit to a shared counter every search_budget.CHECK_INTERVAL nodes, and stop when it
+reaches the node limit of the budget: the search visits at most CHECK_INTERVAL nodes more than node_limit for each
+process.
+
+The process pool is created by the first call and kept for the next ones (with the same number of processes), so
+that the processes are started once: shutdown_pool stops it, and it is stopped when Python exits.
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from modules import array_solver
+from modules import search_budget
+from modules import transposition_table as transposition
+
+NO_SOLUTION = 2**31 - 1
+MAX_SPLIT_DEPTH = 6
+SUBTREES_PER_PROCESS = 8
+POLL_INTERVAL = .05
+
+# state of a worker process, set by _init_worker and by _load_problem
+_worker = {}
+# the pool kept between the calls of solver, see get_pool
+_pool = {'executor': None, 'processes': None, 'best_index': None, 'numb_nodes': None, 'numb_solves': 0}
+# one search at a time uses the pool
+_pool_lock = threading.Lock()
+
+###########
+## Split the tree
+###########
+
+def split_frontier(search:array_solver.ArraySearch, split_depth:int)->list:
+    """
+    Returns the list of the subtrees at split_depth, each one as the list of rows taken to reach its root, in the
+    order of the search. Subtrees where a card on the table belongs to no set are left out.
+    """
+    frontier = []
+
+    def expand(depth):
+        if search.table_left == 0 or depth == split_depth:
+            frontier.append(list(search.sets_taken))
+            return
+        already_lost, next_col = search.choose_card()
+        if already_lost:
+            return
+        for row in search.rows_with_card(next_col):
+            old_live = search.take(row)
+            expand(depth + 1)
+            search.undo(row, old_live)
+
+    search.reset()
+    expand(0)
+    return frontier
+
+
+def choose_split_depth(search:array_solver.ArraySearch, processes:int)->int:
+    """
+    Smallest depth with at least SUBTREES_PER_PROCESS subtrees for each process (at most MAX_SPLIT_DEPTH).
+    """
+    previous = -1
+    for depth in range(1, MAX_SPLIT_DEPTH + 1):
+        numb_subtrees = len(split_frontier(search, depth))
+        if numb_subtrees >= SUBTREES_PER_PROCESS*processes or numb_subtrees == previous:
+            return depth
+        previous = numb_subtrees
+    return MAX_SPLIT_DEPTH
+
+###########
+## Workers
+###########
+
+def _init_worker(best_index, numb_nodes):
+    _worker['best_index'] = best_index
+    _worker['numb_nodes'] = numb_nodes
+    _worker['solve_id'] = None
+
+
+def _load_problem(problem:tuple):
+    """
+    problem is (solve_id, columns, row_cols, multiplicities, cards_on_table, deterministic, use_transposition_table,
+    node_limit). The search is built again only when solve_id changes, i.e. once per call of solver in each
+    process.
+    """
+    solve_id, columns, row_cols, multiplicities, cards_on_table, deterministic, use_transposition_table, \
+        node_limit = problem
+    if _worker['solve_id'] == solve_id:
+        return
+    search = array_solver.ArraySearch(columns, row_cols, multiplicities, cards_on_table)
+    if use_transposition_table:
+        search.transposition_table = transposition.TranspositionTable()
+        search.slots = transposition.card_slots(search.columns)
+    if node_limit is not None:
+        search.stop_check_interval = search_budget.CHECK_INTERVAL
+    _worker['solve_id'] = solve_id
+    _worker['search'] = search
+    _worker['deterministic'] = deterministic
+    _worker['node_limit'] = node_limit
+
+
+def _count_nodes(search:array_solver.ArraySearch)->int:
+    """
+    Adds to the shared counter the nodes of search not counted yet. Returns the nodes of all the workers.
+    """
+    numb_nodes = _worker['numb_nodes']
+    with numb_nodes.get_lock():
+        numb_nodes.value += search.nodes - _worker['counted']
+        _worker['counted'] = search.nodes
+        return numb_nodes.value
+
+
+def _should_stop(search:array_solver.ArraySearch, index:int)->bool:
+    """
+    True if a subtree before index (any subtree if not deterministic) has a way to play, if the search was stopped
+    (best_index -1), or if the workers visited node_limit nodes.
+    """
+    best_index = _worker['best_index'].value
+    if best_index < index or (best_index != NO_SOLUTION and not _worker['deterministic']):
+        return True
+    node_limit = _worker['node_limit']
+    return node_limit is not None and _count_nodes(search) >= node_limit
+
+
+def _search_subtree(problem:tuple, index:int, prefix:list)->(int, bool, list, int):
+    """
+    problem as in _load_problem. Returns (index, found, rows of the winning set, nodes visited). found is None if
+    the search was stopped.
+    """
+    _load_problem(problem)
+    search = _worker['search']
+    best_index = _worker['best_index']
+    search.reset()
+    _worker['counted'] = 0
+    search.should_stop = lambda: _should_stop(search, index)
+    if search.should_stop():
+        return index, None, [], 0
+
+    for row in prefix:
+        search.take(row)
+    try:
+        found = search.search()
+    except array_solver.SearchInterrupted:
+        _count_nodes(search)
+        return index, None, [], search.nodes
+    _count_nodes(search)
+    if found:
+        with best_index.get_lock():
+            best_index.value = min(best_index.value, index)
+    return index, found, list(search.sets_taken), search.nodes
+
+###########
+## Pool
+###########
+
+def get_pool(processes:int)->ProcessPoolExecutor:
+    """
+    The pool of processes kept between the calls of solver, started again only if processes changes.
+    """
+    if _pool['executor'] is None or _pool['processes'] != processes:
+        shutdown_pool()
+        _pool['best_index'] = multiprocessing.Value('i', NO_SOLUTION)
+        _pool['numb_nodes'] = multiprocessing.Value('q', 0)
+        _pool['executor'] = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                                initargs=(_pool['best_index'], _pool['numb_nodes']))
+        _pool['processes'] = processes
+    return _pool['executor']
+
+
+def shutdown_pool():
+    """
+    Stops the processes of the pool, if any.
+    """
+    if _pool['executor'] is not None:
+        _pool['executor'].shutdown()
+    _pool['executor'] = None
+    _pool['processes'] = None
+
+
+atexit.register(shutdown_pool)
+
+###########
+## Main function
+###########
+
+def solver(current_matrix:pd.DataFrame, cards_on_table:dict, processes=None, split_depth=None, deterministic=True,
+           use_transposition_table=False, stats=None, budget=None)->(bool, list):
+    """
+    current_matrix and cards_on_table as in solver.solver (current_matrix can also be a find_matrix.SparseMatrix).
+    processes is the number of processes (default: os.cpu_count()), split_depth the depth at which the tree is
+    split (default: choose_split_depth). If use_transposition_table, each process keeps a transposition table for
+    all its subtrees.
+    If stats is a dict, the number of subtrees and of nodes visited are written in it.
+    If budget is a search_budget.SearchBudget, the workers stop at its node limit (see the module docstring), and it
+    is checked every POLL_INTERVAL seconds for the time and the cancellation: when it is exhausted all the workers
+    are stopped and SearchInterrupted is raised.
+
+    Returns True, winning set if you can play, False, [] otherwise.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    columns, row_cols, multiplicities = array_solver.matrix_to_arrays(current_matrix)
+    search = array_solver.ArraySearch(columns, row_cols, multiplicities, cards_on_table)
+    if search.missing_table_card:
+        return False, []
+    if split_depth is None:
+        split_depth = choose_split_depth(search, processes)
+    frontier = split_frontier(search, split_depth)
+    if stats is not None:
+        stats['subtrees'] = len(frontier)
+
+    node_limit = None if budget is None else budget.node_limit
+    results = {}
+    answer_index = NO_SOLUTION
+    with _pool_lock:
+        executor = get_pool(processes)
+        best_index = _pool['best_index']
+        numb_nodes = _pool['numb_nodes']
+        best_index.value = NO_SOLUTION
+        numb_nodes.value = 0
+        _pool['numb_solves'] += 1
+        problem = (_pool['numb_solves'], columns, [list(map(int, cols)) for cols in row_cols],
+                   [int(m) for m in multiplicities], cards_on_table, deterministic, use_transposition_table,
+                   node_limit)
+        futures = [executor.submit(_search_subtree, problem, index, prefix)
+                   for index, prefix in enumerate(frontier)]
+        pending = set(futures)
+        interrupted = False
+        finished = False
+        while pending and not finished:
+            done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, found, rows, _ = future.result()
+                results[index] = (found, rows)
+                if found:
+                    answer_index = min(answer_index, index)
+                    if not deterministic:
+                        finished = True
+                # deterministic: stop once all the subtrees before the best one are done
+                if answer_index != NO_SOLUTION and all(k in results for k in range(answer_index)):
+                    finished = True
+            if not finished and budget is not None and budget.exhausted(numb_nodes.value):
+                interrupted = True
+                finished = True
+        # the subtrees still running stop at their next check, before the pool is used again (and when the budget
+        # is exhausted)
+        with best_index.get_lock():
+            best_index.value = -1
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        nodes = numb_nodes.value
+    if stats is not None:
+        stats['nodes'] = nodes
+    # subtrees stopped at the node limit, before the answer (or before a way to play was known)
+    if ((deterministic or answer_index == NO_SOLUTION)
+            and any(found is None and index < answer_index for index, (found, _) in results.items())):
+        interrupted = True
+    if interrupted:
+        raise array_solver.SearchInterrupted()
+
+    if answer_index == NO_SOLUTION:
+        return False, []
+    return True, [list(search.row_sets[row]) for row in results[answer_index][1]]
@@ -0,0 +1,95 @@
+"""
+Budgets for the search: a time limit, a limit on the number of nodes and a cancellation token, which another
+thread can use to stop a search.
+
+The search checks the time and the cancellation token every CHECK_INTERVAL nodes (every node for the dataframe
+engine, whose nodes are slow anyway), so that reading the clock does not slow it down, and stops exactly after
+node_limit nodes (the array and dlx engines also check the budget at that node). The workers of the parallel engine
+count their nodes together every CHECK_INTERVAL nodes, so it can go over node_limit by CHECK_INTERVAL nodes for each
+process. When the budget is exhausted the search raises
+array_solver.SearchInterrupted, and solver.solve_with_budget returns a SolveResult with status UNKNOWN together with
+the best partial arrangement found: the sets taken when the fewest tiles of the table were left to place.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+SOLVED = 'solved'
+UNSOLVABLE = 'unsolvable'
+UNKNOWN = 'unknown'
+
+CHECK_INTERVAL = 64
+
+# status is SOLVED, UNSOLVABLE or UNKNOWN, winning_set as in solver.solver, info a dict with the number of nodes,
+# the seconds spent, and if known the best partial arrangement ('partial_sets') and the tiles of the table it
+# does not place ('table_left').
+SolveResult = namedtuple('SolveResult', ['status', 'winning_set', 'info'])
+
+
+class CancellationToken:
+    """
+    Shared between the caller and a search: after cancel() the search stops at its next check.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def cancelled(self)->bool:
+        return self._event.is_set()
+
+
+class SearchBudget:
+    """
+    time_limit in seconds, node_limit an int, cancel_token a CancellationToken. Each of them can be None.
+    """
+    def __init__(self, time_limit=None, node_limit=None, cancel_token=None):
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.cancel_token = cancel_token
+        self.start()
+
+    def start(self):
+        self.started = time.monotonic()
+        self.deadline = None if self.time_limit is None else self.started + self.time_limit
+        self.nodes = 0
+        self.partial_sets = None
+        self.partial_table_left = None
+
+    def elapsed(self)->float:
+        return time.monotonic() - self.started
+
+    def exhausted(self, nodes=None)->bool:
+        """
+        True if the search has to stop after nodes nodes (by default the nodes counted with tick).
+        """
+        if nodes is None:
+            nodes = self.nodes
+        if self.node_limit is not None and nodes >= self.node_limit:
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.cancel_token is not None and self.cancel_token.cancelled()
+
+    def tick(self)->bool:
+        """
+        Counts a node. Returns exhausted().
+        """
+        self.nodes += 1
+        return self.exhausted()
+
+    def record_partial(self, table_left:int, sets_taken:list):
+        """
+        Keeps sets_taken if it leaves fewer tiles on the table than the best partial arrangement so far.
+        """
+        if self.partial_table_left is None or table_left < self.partial_table_left:
+            self.partial_table_left = table_left
+            self.partial_sets = [list(good_set) for good_set in sets_taken]
+
+    def info(self, nodes=None)->dict:
+        return {'nodes': self.nodes if nodes is None else nodes,
+                'seconds': self.elapsed(),
+                'partial_sets': self.partial_sets,
+                'table_left': self.partial_table_left}
@@ -0,0 +1,109 @@
+"""
+Statistics of a search of solver.solver, passed as stats=SearchStats(). For each solve it records:
+- the nodes visited and the deepest node (the number of sets taken),
+- for each depth the number of nodes where we branched and the number of sets tried, i.e. the branching factor,
+- the dead ends found by operations.choose_card (a card on the table belonging to no set), and which cards,
+- the seconds spent choosing the card (operations.choose_card), listing the sets with it
+(operations.sets_with_card) and updating the matrix (operations.get_new_rows_and_cols_removed_or_decreased),
+- the size of the matrix.
+When stats is None the search does not look at the clock nor count anything.
+
+to_dict, to_json export the statistics; callback, if given, is called with to_dict() at the end of each solve.
+"""
+
+import json
+import time
+
+PHASES = ['choose', 'branch', 'update']
+
+
+class SearchStats:
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.max_depth = 0
+        self.expanded = {}
+        self.children = {}
+        self.dead_ends = 0
+        self.dead_end_cards = {}
+        self.transposition_hits = 0
+        self.phase_seconds = {phase: 0. for phase in PHASES}
+        self.matrix_rows = 0
+        self.matrix_columns = 0
+        self.matrix_nonzero = 0
+        self.seconds = 0.
+        self.found = None
+        self.started = None
+
+    ## Called by the search
+
+    def start(self, current_matrix):
+        """
+        Called at the beginning of a solve, current_matrix is the matrix of solver.solver.
+        """
+        self.reset()
+        self.matrix_rows, self.matrix_columns = current_matrix.shape
+        self.matrix_nonzero = int((current_matrix.values > 0).sum())
+        self.started = time.perf_counter()
+
+    def finish(self, found):
+        """
+        Called at the end of a solve, found is True, False or None if the search was interrupted.
+        """
+        self.seconds = time.perf_counter() - self.started
+        self.found = found
+        if self.callback is not None:
+            self.callback(self.to_dict())
+
+    def node(self, depth:int):
+        self.nodes += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def dead_end(self, card:str):
+        self.dead_ends += 1
+        self.dead_end_cards[card] = self.dead_end_cards.get(card, 0) + 1
+
+    def branch(self, depth:int, numb_sets:int):
+        self.expanded[depth] = self.expanded.get(depth, 0) + 1
+        self.children[depth] = self.children.get(depth, 0) + numb_sets
+
+    def add_time(self, phase:str, started:float):
+        """
+        Adds the time from started (a time.perf_counter()) to now to phase.
+        """
+        self.phase_seconds[phase] += time.perf_counter() - started
+
+    ## Export
+
+    def branching_factor(self)->dict:
+        """
+        Returns a dict with keys the depths and values the average number of sets tried at a node of that depth.
+        """
+        return {depth: self.children[depth]/self.expanded[depth] for depth in sorted(self.expanded)}
+
+    def to_dict(self)->dict:
+        return {'found': self.found,
+                'seconds': self.seconds,
+                'nodes': self.nodes,
+                'max_depth': self.max_depth,
+                'branching_factor': self.branching_factor(),
+                'dead_ends': self.dead_ends,
+                'dead_end_cards': dict(self.dead_end_cards),
+                'transposition_hits': self.transposition_hits,
+                'phase_seconds': dict(self.phase_seconds),
+                'matrix': {'rows': self.matrix_rows, 'columns': self.matrix_columns,
+                           'nonzero': self.matrix_nonzero}}
+
+    def to_json(self, path=None)->str:
+        """
+        Returns to_dict() as a JSON string, and saves it in path if given.
+        """
+        result = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(result)
+        return result
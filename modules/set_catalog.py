@@ -0,0 +1,193 @@
+"""
+Main functions: build_catalog and load_catalog. The catalog contains every admissible set of the full game
+(13 numbers x 4 colors, 2 copies of each tile, 2 jokers), so that the matrix of a game is a filter of the catalog
+instead of generating the sets again.
+
+The admissible sets using the tiles in cards are exactly the sets of the catalog whose tiles are all in cards
+(using only 'jb' if there is one joker), because the sets in find_admissible_sets only depend on which tiles
+are present. build_catalog generates them once with the functions of find_admissible_sets, and saves in a folder:
+- set_masks.npy: one uint64 for each set, with bit i set iff the tile CATALOG_CARDS[i] is in the set,
+- set_cards.npy: int8 array (numb sets, 13), the indices in CATALOG_CARDS of the tiles of each set, padded with -1,
+- tile_indptr.npy, tile_sets.npy: for each tile i, tile_sets[tile_indptr[i]:tile_indptr[i+1]] are the sets
+containing it.
+load_catalog memory maps these files.
+
+Run python -m modules.set_catalog to build the catalog in CATALOG_LOCATION.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from modules import find_admissible_sets as admissible_sets
+from modules import find_matrix
+
+COLORS = ['b', 'n', 'o', 'r']
+NUMBERS = [str(number) for number in range(1, 14)]
+CATALOG_CARDS = [number + color for color in COLORS for number in NUMBERS] + ['jb', 'jr']
+CARD_INDEX = {card: i for i, card in enumerate(CATALOG_CARDS)}
+CATALOG_LOCATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'models', 'set_catalog')
+FILES = ['set_masks', 'set_cards', 'tile_indptr', 'tile_sets']
+
+_loaded_catalogs = {}
+
+###########
+## Build
+###########
+
+def all_admissible_sets()->list:
+    """
+    Returns: list of tuples, every admissible set (without repetitions) of the full game.
+    The same-number sets come first, then the same-color sets, as in find_matrix.get_matrix.
+    """
+    result = []
+    seen = set()
+    for number in NUMBERS:
+        for valid_set in admissible_sets.valid_same_number_sets([number + color for color in COLORS], 2):
+            key = frozenset(valid_set)
+            if key not in seen:
+                seen.add(key)
+                result.append(tuple(sorted(valid_set)))
+    for color in COLORS:
+        for valid_set in admissible_sets.valid_same_color_sets(list(range(1, 14)), 2):
+            colored = tuple(sorted(card + color if card[0] != 'j' else card for card in valid_set))
+            key = frozenset(colored)
+            if key not in seen:
+                seen.add(key)
+                result.append(colored)
+    return result
+
+
+def build_catalog(location=CATALOG_LOCATION):
+    """
+    Builds the catalog and saves it in the folder location.
+    """
+    valid_sets = all_admissible_sets()
+    numb_sets = len(valid_sets)
+
+    set_masks = np.zeros(numb_sets, dtype=np.uint64)
+    set_cards = np.full((numb_sets, len(NUMBERS)), -1, dtype=np.int8)
+    sets_of_tile = [[] for _ in CATALOG_CARDS]
+    for set_id, valid_set in enumerate(valid_sets):
+        mask = 0
+        for k, card in enumerate(valid_set):
+            i = CARD_INDEX[card]
+            mask |= 1 << i
+            set_cards[set_id, k] = i
+            sets_of_tile[i].append(set_id)
+        set_masks[set_id] = mask
+
+    tile_indptr = np.zeros(len(CATALOG_CARDS) + 1, dtype=np.int32)
+    tile_indptr[1:] = np.cumsum([len(sets) for sets in sets_of_tile])
+    tile_sets = np.array([set_id for sets in sets_of_tile for set_id in sets], dtype=np.int32)
+
+    os.makedirs(location, exist_ok=True)
+    for name, array in zip(FILES, [set_masks, set_cards, tile_indptr, tile_sets]):
+        np.save(os.path.join(location, name + '.npy'), array)
+    _loaded_catalogs.pop(location, None)
+    return numb_sets
+
+###########
+## Load and filter
+###########
+
+def load_catalog(location=CATALOG_LOCATION, build_if_missing=True)->dict:
+    """
+    Returns a dict with keys FILES and values the memory mapped arrays. The catalog is built first if it is not
+    in location and build_if_missing. Catalogs already loaded are not loaded again.
+    """
+    if location in _loaded_catalogs:
+        return _loaded_catalogs[location]
+    paths = {name: os.path.join(location, name + '.npy') for name in FILES}
+    if not all(os.path.exists(path) for path in paths.values()):
+        if not build_if_missing:
+            raise FileNotFoundError('No catalog in ' + location + '. Run python -m modules.set_catalog')
+        build_catalog(location)
+    catalog = {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+    _loaded_catalogs[location] = catalog
+    return catalog
+
+
+def cards_to_mask(cards)->int:
+    """
+    Input: cards is an iterable of strings in CATALOG_CARDS.
+    Returns: int with bit i set iff CATALOG_CARDS[i] is in cards.
+    """
+    mask = 0
+    for card in cards:
+        if card not in CARD_INDEX:
+            raise ValueError('Unknown tile ' + str(card))
+        mask |= 1 << CARD_INDEX[card]
+    return mask
+
+
+def sets_with_tiles(present_cards, catalog=None)->np.ndarray:
+    """
+    Input: present_cards is an iterable of strings in CATALOG_CARDS (jokers as 'jb', 'jr').
+    Returns: the ids of the sets of the catalog made only of tiles in present_cards, in the order of the catalog.
+    """
+    if catalog is None:
+        catalog = load_catalog()
+    missing = ~np.uint64(cards_to_mask(present_cards))
+    return np.flatnonzero((catalog['set_masks'] & missing) == 0)
+
+
+def sets_containing(card:str, catalog=None)->np.ndarray:
+    """
+    Returns the ids of the sets of the catalog containing card.
+    """
+    if catalog is None:
+        catalog = load_catalog()
+    i = CARD_INDEX[card]
+    return np.asarray(catalog['tile_sets'][catalog['tile_indptr'][i]:catalog['tile_indptr'][i+1]])
+
+
+def set_from_id(set_id:int, catalog=None)->list:
+    if catalog is None:
+        catalog = load_catalog()
+    return [CATALOG_CARDS[i] for i in catalog['set_cards'][set_id] if i >= 0]
+
+
+def matrix_from_catalog(card_multiplicities:dict, return_pd_dataframe=True, catalog=None, return_sparse=False,
+                        set_ids=None):
+    """
+    Input: card_multiplicities is a dic with keys cards (jokers as 'jb', 'jr') and values their multiplicities,
+    as card_mult in find_matrix.from_cards_to_matrix.
+    set_ids, if not None, are the ids returned by sets_with_tiles(card_multiplicities.keys()), if already known.
+    Returns: the same matrix as find_matrix.get_matrix (up to the order of the rows), as a pd.DataFrame if
+    return_pd_dataframe, otherwise as a find_matrix.SparseMatrix if return_sparse, otherwise as a np.array.
+    """
+    if catalog is None:
+        catalog = load_catalog()
+    sorted_cards = sorted(list(card_multiplicities.keys()))
+    if set_ids is None:
+        set_ids = sets_with_tiles(sorted_cards, catalog)
+
+    # column of the matrix for each tile of the catalog, the cards in a set are sorted as the columns
+    to_column = np.full(len(CATALOG_CARDS), -1, dtype=np.int64)
+    for j, card in enumerate(sorted_cards):
+        to_column[CARD_INDEX[card]] = j
+    multiplicities = np.array([card_multiplicities[card] for card in sorted_cards], dtype=float)
+
+    set_cards = np.asarray(catalog['set_cards'][set_ids]).astype(np.int64)
+    columns = np.where(set_cards >= 0, to_column[set_cards], len(sorted_cards))
+    columns.sort(axis=1)
+    sizes = (set_cards >= 0).sum(axis=1)
+    indptr = np.zeros(len(set_ids) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(sizes)
+    indices = columns[columns < len(sorted_cards)].astype(np.int32)
+    sparse_matrix = find_matrix.SparseMatrix(indptr, indices, multiplicities[indices], sorted_cards)
+
+    if return_pd_dataframe:
+        return pd.DataFrame(find_matrix.sparse_to_dense(sparse_matrix), columns=sorted_cards)
+    if return_sparse:
+        return sparse_matrix
+    return find_matrix.sparse_to_dense(sparse_matrix)
+
+
+if __name__ == '__main__':
+    location = sys.argv[1] if len(sys.argv) > 1 else CATALOG_LOCATION
+    print('Saved', build_catalog(location), 'sets in', location)
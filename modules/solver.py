@@ -1,20 +1,35 @@
 """
-Main function: solver.
+Main functions: solver and solve_with_budget.
+
+The default engine works on the pd.DataFrame, dropping the rows and columns removed at every node. With
+engine='array' the same search runs on the fixed arrays of array_solver, with engine='dlx' the search is done
+with dancing links in dlx_solver, and with engine='parallel' the search of array_solver is split between
+processes by parallel_solver.
+
+solve_with_budget runs the search with a time limit, a node limit and/or a cancellation token (see search_budget),
+and tells apart a position where you cannot play from one where the budget ran out.
+
+Passing stats=search_stats.SearchStats() to solver records the nodes, branching factor, dead ends and time spent in
+each phase of the search (dataframe engine only).
 """
 
 
-import numpy as np
-import itertools
 import pandas as pd
+import time
 
-import importlib
-from modules import find_admissible_sets as admissible_sets
-from modules import find_matrix as find_matrix
 from modules import operations_with_matrix as operations
+from modules import array_solver
+from modules import search_budget
+# dlx_solver and parallel_solver (which imports multiprocessing) are imported only by their engines, to keep the
+# import of the solver fast
 
 
-def solver(current_matrix:pd.DataFrame, cards_on_table:dict, sets_taken=[], rows_removed=[], columns_removed=[],
-           columns_decreased=[], print_intermediate_outputs=False):
+ENGINES = ['dataframe', 'array', 'dlx', 'parallel']
+
+
+def solver(current_matrix:pd.DataFrame, cards_on_table:dict, sets_taken=None, rows_removed=None, columns_removed=None,
+           columns_decreased=None, print_intermediate_outputs=False, engine='dataframe', transposition_table=None,
+           tile_counter=None, budget=None, stats=None):
     """
     current_matrix is a pd.df with columns the cards, rows the admissible sets. The jokers are distinct, so
     that each set does not contain multiple cards. So cards_on_table does not have a 'j' key, if it has a joker
@@ -35,14 +50,71 @@ def solver(current_matrix:pd.DataFrame, cards_on_table:dict, sets_taken=[], rows
     Step 4: For each one of the sets of step 3, assume you took it. This will give a new matrix, new cards on table,..
     For each of these new combinations, check if you win. If there is a winning combination stop and return it,
     if not return false, []
+    
+    engine is one of ENGINES. With engine='array' the search runs in array_solver.solver (only from the starting
+    position, i.e. with sets_taken, rows_removed, ... None or empty) and returns the same result. engine='dlx' uses
+    dlx_solver.solver and engine='parallel' parallel_solver.solver with its default arguments (also only from the
+    starting position). The parallel engine returns the same result as the array engine.
+    
+    transposition_table is None or a transposition_table.TranspositionTable. If given, the positions from which
+    we cannot play are stored in it and skipped when reached again (also by a different order of the sets).
+    
+    tile_counter is an operations.TileCounter with the cards remaining on the table after taking sets_taken. It is
+    created by the first call and passed to the recursive calls: each set taken is removed from it before the
+    recursive call and given back after, so the checks of step 1 do not go through sets_taken.
+    
+    budget is None or a search_budget.SearchBudget, checked at every node of the dataframe engine: when it is
+    exhausted the search raises array_solver.SearchInterrupted. Use solve_with_budget instead of passing it here.
+    
+    stats is None or a search_stats.SearchStats, which records the statistics of the search (only for the
+    dataframe engine). With stats=None nothing is timed nor counted.
     """
+    if engine not in ENGINES:
+        raise ValueError('engine must be one of ' + str(ENGINES) + ', got ' + str(engine))
+    if stats is not None and engine != 'dataframe':
+        raise ValueError('stats is only recorded by the dataframe engine, got engine ' + str(engine))
+    if engine == 'array':
+        return array_solver.solver(current_matrix, cards_on_table, transposition_table)
+    if engine == 'dlx':
+        from modules import dlx_solver
+        return dlx_solver.solver(current_matrix, cards_on_table, transposition_table)
+    if engine == 'parallel':
+        from modules import parallel_solver
+        return parallel_solver.solver(current_matrix, cards_on_table)
+    
+    sets_taken = [] if sets_taken is None else sets_taken
+    rows_removed = [] if rows_removed is None else rows_removed
+    columns_removed = [] if columns_removed is None else columns_removed
+    columns_decreased = [] if columns_decreased is None else columns_decreased
+    
+    if tile_counter is None:
+        # the multiplicities of the cards are read once, for the keys of the transposition table
+        tile_counter = operations.TileCounter(cards_on_table, sets_taken,
+                                              current_matrix if transposition_table is not None else None)
+        if stats is not None:
+            # first call: the statistics are of this solve
+            stats.start(current_matrix)
+            found = None
+            try:
+                found, winning_set = solver(current_matrix, cards_on_table, sets_taken, rows_removed,
+                                            columns_removed, columns_decreased, print_intermediate_outputs,
+                                            transposition_table=transposition_table, tile_counter=tile_counter,
+                                            budget=budget, stats=stats)
+            finally:
+                stats.finish(found)
+            return found, winning_set
+    
+    if stats is not None:
+        stats.node(len(sets_taken))
+    
+    if budget is not None:
+        budget.record_partial(tile_counter.table_left, sets_taken)
+        if budget.tick():
+            raise array_solver.SearchInterrupted()
     
     ## table is empty
-    cards_remaining, taken_from_hand = operations.remaining_cards_on_table(sets_taken,
-                                                                cards_on_table,
-                                                                return_bool=True)
-    if not cards_remaining: 
-        if taken_from_hand:
+    if tile_counter.table_is_empty():
+        if tile_counter.taken_from_hand:
             return True, sets_taken
         return len(rows_removed)< current_matrix.shape[0], sets_taken
     
@@ -50,26 +122,50 @@ def solver(current_matrix:pd.DataFrame, cards_on_table:dict, sets_taken=[], rows
     # we check if we already lost (i.e. if there is a card belonging to no valid set). If not, we choose a
     # card belonging to the least number of valid sets (i.e. next_card)
     
+    if stats is not None:
+        started = time.perf_counter()
     already_lost, next_card = operations.choose_card(current_matrix,
                                           sets_taken,
                                           rows_removed,
                                           columns_removed,
-                                          cards_on_table)
+                                          cards_on_table,
+                                          tile_counter)
+    if stats is not None:
+        stats.add_time('choose', started)
     
     if already_lost:
+        if stats is not None:
+            stats.dead_end(next_card)
         return False, []
     if print_intermediate_outputs:
         print('next_card:', next_card)
     
+    key = None
+    if transposition_table is not None:
+        key = tile_counter.state_key()
+        if transposition_table.is_failure(key):
+            if stats is not None:
+                stats.transposition_hits += 1
+            return False, []
+    
     # list of set containing next_card
+    if stats is not None:
+        started = time.perf_counter()
     current_valid_sets = operations.sets_with_card(current_matrix, rows_removed, columns_removed, next_card)
+    if stats is not None:
+        stats.add_time('branch', started)
+        stats.branch(len(sets_taken), len(current_valid_sets))
     
     for valid_set in current_valid_sets:
+        if stats is not None:
+            started = time.perf_counter()
         new_rows_removed, new_col_removed, new_col_decreased = operations.get_new_rows_and_cols_removed_or_decreased(current_matrix,
                                                                                                           rows_removed,
                                                                                                           columns_removed,
                                                                                                           columns_decreased,
                                                                                                           valid_set)
+        if stats is not None:
+            stats.add_time('update', started)
         if print_intermediate_outputs:
             print('valid_set', valid_set)
             print('prev col removed', columns_removed)
@@ -83,16 +179,77 @@ def solver(current_matrix:pd.DataFrame, cards_on_table:dict, sets_taken=[], rows
             print('new matrix cols:', new_matrix.columns)
             print(new_matrix)
         
+        tile_counter.take(valid_set)
         finished, winning_set = solver(current_matrix,
                                        cards_on_table,
                                        sets_taken + [valid_set],
                                        rows_removed + new_rows_removed,
                                        columns_removed + new_col_removed,
-                                       columns_decreased + new_col_decreased)
+                                       columns_decreased + new_col_decreased,
+                                       transposition_table=transposition_table,
+                                       tile_counter=tile_counter,
+                                       budget=budget,
+                                       stats=stats)
+        tile_counter.give_back(valid_set)
         if print_intermediate_outputs:
             print('finished:', finished)
             print('-------')
         
         if finished:
             return True, winning_set
+    
+    if key is not None:
+        transposition_table.add_failure(key)
     return False, []
+
+
+
+def solve_with_budget(current_matrix:pd.DataFrame, cards_on_table:dict, time_limit=None, node_limit=None,
+                      cancel_token=None, engine='array', transposition_table=None)->search_budget.SolveResult:
+    """
+    current_matrix, cards_on_table, engine and transposition_table as in solver. time_limit is in seconds,
+    node_limit an int, cancel_token a search_budget.CancellationToken (cancel it from another thread to stop the
+    search). Each of them can be None.
+    
+    Returns a search_budget.SolveResult: status is search_budget.SOLVED (and winning_set is the way to play),
+    search_budget.UNSOLVABLE (you cannot play) or search_budget.UNKNOWN (the budget ran out first). info has the
+    nodes visited, the seconds spent and, for the array and dataframe engines, the best partial arrangement.
+    """
+    if engine not in ENGINES:
+        raise ValueError('engine must be one of ' + str(ENGINES) + ', got ' + str(engine))
+    budget = search_budget.SearchBudget(time_limit, node_limit, cancel_token)
+    nodes = None
+    try:
+        if engine == 'array':
+            search = array_solver.ArraySearch.from_dataframe(current_matrix, cards_on_table)
+            search.use_budget(budget)
+            try:
+                found, winning_set = search.solve(transposition_table)
+            finally:
+                nodes = search.nodes
+        elif engine == 'dlx':
+            from modules import dlx_solver
+            search = dlx_solver.DancingLinks.from_dataframe(current_matrix, cards_on_table)
+            search.should_stop = lambda: budget.exhausted(search.nodes)
+            search.stop_check_interval = search_budget.CHECK_INTERVAL
+            search.stop_at_node = budget.node_limit
+            try:
+                found, winning_set = search.solve(transposition_table)
+            finally:
+                nodes = search.nodes
+        elif engine == 'parallel':
+            from modules import parallel_solver
+            stats = {}
+            try:
+                found, winning_set = parallel_solver.solver(current_matrix, cards_on_table, stats=stats,
+                                                            budget=budget)
+            finally:
+                nodes = stats.get('nodes')
+        else:
+            found, winning_set = solver(current_matrix, cards_on_table, transposition_table=transposition_table,
+                                        budget=budget)
+    except array_solver.SearchInterrupted:
+        return search_budget.SolveResult(search_budget.UNKNOWN, [], budget.info(nodes))
+    
+    status = search_budget.SOLVED if found else search_budget.UNSOLVABLE
+    return search_budget.SolveResult(status, winning_set, budget.info(nodes))
@@ -0,0 +1,101 @@
+"""
+Transposition table for the solver: remembers the positions from which we already know that you cannot play.
+
+A position is determined by the tiles of the table still to be placed, the tiles of the hand still available and
+whether we already took a tile from the hand: the valid sets left are those whose tiles are all still available, so
+whatever sets were taken to get there, the result of the search from there is the same. The key of a position
+is a canonical encoding of these three things:
+- the counts of the remaining tiles on the table, one byte for each tile in ALL_CARDS,
+- the counts of the remaining tiles in the hand, one byte for each tile in ALL_CARDS,
+- one byte for the flag.
+The two jokers 'jb', 'jr' are interchangeable, so they share a byte. Keys do not depend on the matrix, so a table
+can be shared between solves.
+
+Only failures are stored. The table has a maximum size, when it is full the least recently used key is dropped.
+"""
+
+from collections import OrderedDict
+
+COLORS = ['b', 'n', 'o', 'r']
+ALL_CARDS = [str(number) + color for color in COLORS for number in range(1, 14)] + ['j']
+CARD_SLOTS = {card: slot for slot, card in enumerate(ALL_CARDS)}
+CARD_SLOTS['jb'] = CARD_SLOTS['j']
+CARD_SLOTS['jr'] = CARD_SLOTS['j']
+NUMB_SLOTS = len(ALL_CARDS)
+
+
+def card_slots(cards:list)->list:
+    """
+    Input: cards is a list of strings (the columns of the matrix).
+    Returns: list of int, the byte of each card in the keys.
+    """
+    slots = []
+    for card in cards:
+        if card not in CARD_SLOTS:
+            raise ValueError('Unknown tile ' + str(card) + ', cannot encode the position.')
+        slots.append(CARD_SLOTS[card])
+    return slots
+
+
+def encode_state(slots:list, table_remaining:list, hand_remaining:list, taken_from_hand:bool)->bytes:
+    """
+    Input: slots as returned by card_slots, table_remaining[i] and hand_remaining[i] the copies of the i-th card
+    left on the table and in the hand, taken_from_hand a bool.
+    Returns: the key of the position.
+    """
+    table = bytearray(NUMB_SLOTS)
+    hand = bytearray(NUMB_SLOTS)
+    for i, slot in enumerate(slots):
+        table[slot] += table_remaining[i]
+        hand[slot] += hand_remaining[i]
+    return bytes(table) + bytes(hand) + (b'\x01' if taken_from_hand else b'\x00')
+
+
+class TranspositionTable:
+    """
+    LRU set of the keys of positions from which you cannot play, with at most max_size keys.
+    """
+    def __init__(self, max_size=1000000):
+        if max_size < 1:
+            raise ValueError('max_size must be positive, got ' + str(max_size))
+        self.max_size = max_size
+        self.failures = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.failures)
+
+    def is_failure(self, key:bytes)->bool:
+        """
+        True if key is known to be a position from which you cannot play.
+        """
+        if key in self.failures:
+            self.failures.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add_failure(self, key:bytes):
+        self.failures[key] = None
+        self.failures.move_to_end(key)
+        if len(self.failures) > self.max_size:
+            self.failures.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.failures.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self)->dict:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits/lookups if lookups else 0.,
+                'size': len(self.failures),
+                'max_size': self.max_size,
+                'evictions': self.evictions}
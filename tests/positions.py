@@ -0,0 +1,72 @@
+"""
+Positions (tiles on the table, tiles in the hand, jokers as 'j') shared by the tests: FIXED_POSITIONS written by
+hand, and positions of each scenario of benchmarks.game_states, always generated with the same seed.
+"""
+
+import functools
+
+from benchmarks import game_states
+from modules import find_matrix
+from modules import solver
+
+FIXED_POSITIONS = [
+    (['3b', '4b', '5b'], ['6b']),
+    (['3b', '4b', '5b'], ['7r']),
+    (['3b', '4b', '5b', '7r', '7b', '7n'], ['6b', '7o']),
+    (['1r', '2r', '3r', '4r'], ['1b', '1n']),
+    (['10o', '11o', '12o', '13o'], ['9o', '8o']),
+    (['5n', '5r', '5o'], ['j', '2b']),
+    (['j', '8b', '9b'], ['10b', '8r', '8n']),
+    (['2n', '3n', 'j', '5n', '9r', '9b', '9o'], ['9n', '1n']),
+    (['4o', '5o', '6o', '6o', '7o', '8o'], ['6b', '6r']),
+    (['12b', '12r', '12n', '12b', '12r', '12o'], ['12n', '12o', 'j']),
+    (['1b', '2b', '3b'], ['1b', '2b', '3b']),
+    (['6r', '7r', '8r', '8b', '8n', '8o'], ['9r', '10r', '11n']),
+]
+NUMB_GENERATED = 3
+SEED = 0
+
+
+@functools.lru_cache(maxsize=None)
+def positions()->tuple:
+    """
+    FIXED_POSITIONS, then NUMB_GENERATED positions of each of game_states.SCENARIOS (generated once).
+    """
+    generated = [(state.table, state.hand) for scenario in game_states.SCENARIOS
+                 for state in game_states.generate_states(scenario, NUMB_GENERATED, SEED)]
+    return tuple(FIXED_POSITIONS + generated)
+
+
+def solver_inputs(table:list, hand:list):
+    """
+    The matrix and the cards on the table to pass to solver.solver, as Rummikub_main computes them.
+    """
+    matrix = find_matrix.from_cards_to_matrix(table + hand)
+    return matrix, find_matrix.create_dic_multiplicities(table, diversify_jokers=True)
+
+
+@functools.lru_cache(maxsize=None)
+def reference_results()->tuple:
+    """
+    For each of positions(), the result of solver.solver with the dataframe engine (computed once).
+    """
+    return tuple(solver.solver(*solver_inputs(table, hand)) for table, hand in positions())
+
+
+def check_winning_set(winning_set:list, table:list, hand:list):
+    """
+    Asserts that each set of winning_set is a valid set of table + hand, that the sets use all the tiles of table
+    and that they use no more copies of a tile than there are.
+    """
+    matrix = find_matrix.from_cards_to_matrix(table + hand)
+    valid_sets = {frozenset(matrix.columns[row > 0]) for row in matrix.to_numpy()}
+    used = {}
+    for valid_set in winning_set:
+        assert frozenset(valid_set) in valid_sets, valid_set
+        for card in valid_set:
+            card = 'j' if card[0] == 'j' else card
+            used[card] = used.get(card, 0) + 1
+    for card in set(table):
+        assert used.get(card, 0) >= table.count(card), card
+    for card, copies in used.items():
+        assert copies <= (table + hand).count(card), card
@@ -0,0 +1,69 @@
+"""
+Each engine, the optimizer, solve_batch and GameSession find a way to play exactly when the dataframe engine of
+solver.solver does, on the positions of tests.positions, and their winning sets are valid.
+"""
+
+import pytest
+
+from modules import batch_solver
+from modules import game_session
+from modules import optimizer
+from modules import solver
+from tests.positions import positions, solver_inputs, reference_results, check_winning_set
+
+
+@pytest.mark.parametrize('engine', ['array', 'dlx', 'parallel'])
+def test_engine_matches_dataframe(engine):
+    for (table, hand), (can_play, winning_set) in zip(positions(), reference_results()):
+        result = solver.solver(*solver_inputs(table, hand), engine=engine)
+        assert result[0] == can_play, (table, hand)
+        if engine != 'dlx':
+            # same search as the dataframe engine, so the same winning set
+            assert result == (can_play, winning_set), (table, hand)
+        if result[0]:
+            check_winning_set(result[1], table, hand)
+
+
+def test_dataframe_winning_sets_are_valid():
+    for (table, hand), (can_play, winning_set) in zip(positions(), reference_results()):
+        if can_play:
+            check_winning_set(winning_set, table, hand)
+
+
+def test_optimizer_matches_dataframe():
+    for (table, hand), (can_play, _) in zip(positions(), reference_results()):
+        found, best_sets, _, _ = optimizer.optimize(*solver_inputs(table, hand))
+        assert found == can_play, (table, hand)
+        if found:
+            check_winning_set(best_sets, table, hand)
+
+
+def test_solve_batch_matches_dataframe():
+    results = batch_solver.solve_batch(positions())
+    for (table, hand), (can_play, _), (found, winning_set) in zip(positions(), reference_results(), results):
+        assert found == can_play, (table, hand)
+        if found:
+            check_winning_set(winning_set, table, hand)
+
+
+def test_game_session_matches_dataframe():
+    for (table, hand), (can_play, _) in zip(positions(), reference_results()):
+        found, winning_set = game_session.GameSession(table, hand).solve()
+        assert found == can_play, (table, hand)
+        if found:
+            check_winning_set(winning_set, table, hand)
+
+
+def test_game_session_after_changes():
+    session = game_session.GameSession(['3b', '4b', '5b'], ['7r'])
+    assert not session.solve()[0]
+    session.add_tile('6b')
+    found, winning_set = session.solve()
+    assert found
+    check_winning_set(winning_set, ['3b', '4b', '5b'], ['7r', '6b'])
+    session.apply_move(winning_set)
+    assert sorted(session.cards_on_table()) == ['3b', '4b', '5b', '6b']
+    assert session.cards_on_hand() == ['7r']
+    session.remove_tile('7r')
+    session.add_tile('j')
+    assert session.solve()[0] == solver.solver(*solver_inputs(['3b', '4b', '5b', '6b'], ['j']))[0]
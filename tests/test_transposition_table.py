@@ -0,0 +1,20 @@
+"""
+The transposition table only skips positions from which we cannot play: with it, each engine finds a way to play
+exactly when it finds one without it.
+"""
+
+import pytest
+
+from modules import solver
+from modules import transposition_table as transposition
+from tests.positions import positions, solver_inputs, reference_results
+
+
+@pytest.mark.parametrize('engine', ['dataframe', 'array', 'dlx'])
+def test_same_result_with_transposition_table(engine):
+    for (table, hand), (can_play, _) in zip(positions(), reference_results()):
+        matrix, cards_on_table = solver_inputs(table, hand)
+        can_play_tt, winning_set = solver.solver(matrix, cards_on_table, engine=engine,
+                                                 transposition_table=transposition.TranspositionTable())
+        assert can_play_tt == can_play, (table, hand)
+        assert bool(winning_set) == can_play_tt, (table, hand)